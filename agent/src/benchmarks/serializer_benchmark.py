@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of the agent message serialization.
+Run from agent/src: python -m benchmarks.serializer_benchmark
+"""
+import argparse
+import timeit
+
+from file_datasource import FileDatasource
+from schema.aggregated_data_schema import AggregatedDataSchema
+from schema.aggregated_data_serializer import dumps_aggregated_data
+
+
+def load_samples(count):
+    datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv")
+    datasource.startReading()
+    try:
+        return [datasource.read() for _ in range(count)]
+    finally:
+        datasource.stopReading()
+
+
+def check_identical(samples):
+    schema = AggregatedDataSchema()
+    for data in samples:
+        expected = schema.dumps(data)
+        actual = dumps_aggregated_data(data)
+        if expected != actual:
+            raise AssertionError(f"Serializers differ:\n{expected}\n{actual}")
+
+
+def run(count, repeat):
+    samples = load_samples(count)
+    check_identical(samples)
+
+    shared_schema = AggregatedDataSchema()
+    paths = {
+        "marshmallow, schema per message": lambda: [
+            AggregatedDataSchema().dumps(data) for data in samples
+        ],
+        "marshmallow, shared schema": lambda: [shared_schema.dumps(data) for data in samples],
+        "precompiled serializer": lambda: [dumps_aggregated_data(data) for data in samples],
+    }
+
+    baseline = None
+    for name, path in paths.items():
+        best = min(timeit.repeat(path, number=1, repeat=repeat)) / count
+        baseline = baseline or best
+        print(
+            f"{name:<34} {best * 1e6:8.2f} us/msg {1 / best:10.0f} msg/s/core "
+            f"x{baseline / best:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10_000, help="messages per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best one is reported")
+    args = parser.parse_args()
+    run(args.count, args.repeat)
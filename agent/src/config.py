@@ -16,3 +16,59 @@ MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "agent"
 
 # Delay for sending data to mqtt in seconds
 DELAY = try_parse(float, os.environ.get("DELAY")) or 1
+
+# Run mode: "single" publishes one vehicle, "load" runs the load generator
+AGENT_MODE = os.environ.get("AGENT_MODE") or "single"
+
+# Load generator config
+# Number of virtual agents simulated in one process
+LOAD_AGENTS = try_parse(int, os.environ.get("LOAD_AGENTS")) or 100
+# user_id of the first virtual agent, the rest get consecutive ids
+LOAD_FIRST_USER_ID = try_parse(int, os.environ.get("LOAD_FIRST_USER_ID")) or 1
+# Target rate of every agent in messages per second, a comma separated
+# list is assigned to the agents round-robin (e.g. "10,50,100")
+LOAD_RATES = [
+    rate
+    for rate in (
+        try_parse(float, value)
+        for value in (os.environ.get("LOAD_RATE") or "10").split(",")
+    )
+    if rate
+] or [10.0]
+# Shift of the start position in the recordings between two neighbour agents
+LOAD_OFFSET_STEP = try_parse(int, os.environ.get("LOAD_OFFSET_STEP")) or 37
+# Number of MQTT connections the agents are spread across
+LOAD_CLIENTS = try_parse(int, os.environ.get("LOAD_CLIENTS")) or 1
+# QoS of the published messages, publish latency is measured up to PUBACK for QoS > 0
+LOAD_QOS = try_parse(int, os.environ.get("LOAD_QOS")) or 0
+# Interval of the achieved rate / latency report in seconds
+LOAD_REPORT_INTERVAL = try_parse(float, os.environ.get("LOAD_REPORT_INTERVAL")) or 5
+# Duration of the run in seconds, 0 runs forever
+LOAD_DURATION = try_parse(float, os.environ.get("LOAD_DURATION")) or 0
+
+# Binary recording made by recording.py, csv files are read when it is not set
+RECORDING_FILENAME = os.environ.get("RECORDING_FILENAME")
+
+# Wire format of the published messages: "json" sends one document per sample,
+# "binary" packs BATCH_SIZE samples into one message
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT") or "json"
+BATCH_SIZE = try_parse(int, os.environ.get("BATCH_SIZE")) or 10
+
+# What the publish loop does when it falls behind its deadlines:
+# "catch_up" sends missed samples back to back (at most MAX_BACKLOG of them),
+# "skip" drops them and continues at the next slot
+CATCH_UP_POLICY = os.environ.get("CATCH_UP_POLICY") or "catch_up"
+MAX_BACKLOG = try_parse(int, os.environ.get("MAX_BACKLOG")) or 100
+# Interval of the achieved rate / lateness report of the publish loop in seconds, 0 disables it
+REPORT_INTERVAL = try_parse(float, os.environ.get("REPORT_INTERVAL"))
+if REPORT_INTERVAL is None:
+    REPORT_INTERVAL = 10
+
+# Store-and-forward spool for messages the broker did not accept, disabled when not set
+SPOOL_FILENAME = os.environ.get("SPOOL_FILENAME")
+# Size of the spool file in bytes, the oldest messages are dropped when it is full
+SPOOL_CAPACITY = try_parse(int, os.environ.get("SPOOL_CAPACITY")) or 64 * 1024 * 1024
+# Maximum rate of replaying spooled messages after a reconnect in messages per second
+SPOOL_DRAIN_RATE = try_parse(float, os.environ.get("SPOOL_DRAIN_RATE")) or 100
+# Maximum number of replayed messages not yet written to the broker connection
+SPOOL_MAX_IN_FLIGHT = try_parse(int, os.environ.get("SPOOL_MAX_IN_FLIGHT")) or 10
@@ -5,7 +5,7 @@ from domain.accelerometer import Accelerometer
 from domain.gps import Gps
 
 
-@dataclass
+@dataclass(slots=True)
 class AggregatedData:
     accelerometer: Accelerometer
     gps: Gps
@@ -13,9 +13,13 @@ class FileDatasource:
         self,
         accelerometer_filename: str,
         gps_filename: str,
+        user_id: int = config.USER_ID,
+        start_offset: int = 0,
     ) -> None:
         self.accelerometer_filename = accelerometer_filename
         self.gps_filename = gps_filename
+        self.user_id = user_id
+        self.start_offset = start_offset
 
         self.is_reading = False
 
@@ -33,18 +37,8 @@ class FileDatasource:
         if not self.acc_reader or not self.gps_reader:
             raise RuntimeError("File readers not initialized")
 
-        acc_row = next(self.acc_reader, None)
-        gps_row = next(self.gps_reader, None)
-
-        if acc_row is None:
-            self._rewind_acc_file()
-            acc_row = next(self.acc_reader)
-
-        if gps_row is None:
-            self._rewind_gps_file()
-            gps_row = next(self.gps_reader)
-        
-        print(acc_row)
+        acc_row = self._next_acc_row()
+        gps_row = self._next_gps_row()
 
         acc_data = Accelerometer(
             x=int(acc_row["x"]), y=int(acc_row["y"]), z=int(acc_row["z"]), air=int(acc_row["air"]), noise=int(acc_row["noise"])
@@ -58,7 +52,7 @@ class FileDatasource:
             accelerometer=acc_data,
             gps=gps_data,
             timestamp=datetime.now(),
-            user_id=config.USER_ID,
+            user_id=self.user_id,
         )
 
     def startReading(self, *args, **kwargs):
@@ -69,6 +63,10 @@ class FileDatasource:
         self.acc_reader = csv.DictReader(self.acc_file)
         self.gps_reader = csv.DictReader(self.gps_file)
 
+        for _ in range(self.start_offset):
+            self._next_acc_row()
+            self._next_gps_row()
+
         self.is_reading = True
 
     def stopReading(self, *args, **kwargs):
@@ -85,6 +83,22 @@ class FileDatasource:
             self.gps_file = None
             self.gps_reader = None
 
+    def _next_acc_row(self) -> dict:
+        """Наступний рядок акселерометра з переходом на початок файлу в кінці"""
+        acc_row = next(self.acc_reader, None)
+        if acc_row is None:
+            self._rewind_acc_file()
+            acc_row = next(self.acc_reader)
+        return acc_row
+
+    def _next_gps_row(self) -> dict:
+        """Наступний рядок GPS з переходом на початок файлу в кінці"""
+        gps_row = next(self.gps_reader, None)
+        if gps_row is None:
+            self._rewind_gps_file()
+            gps_row = next(self.gps_reader)
+        return gps_row
+
     def _rewind_acc_file(self):
         """Скидання потоку файлу акселерометра на початок для реалізації нескінченного читання"""
         if self.acc_file:
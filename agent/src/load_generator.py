@@ -0,0 +1,326 @@
+import heapq
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Union
+
+from paho.mqtt.client import MQTT_ERR_NO_CONN
+
+from file_datasource import FileDatasource
+from recording import RecordingDatasource
+from scheduler import CATCH_UP, DeadlineScheduler, clock, sleep_until
+from spool import SpoolDrainer, start_spool
+from schema.message_encoder import BatchMessageEncoder, JsonMessageEncoder, make_message_encoder
+import config
+
+
+class PublishStats:
+    """Counters of the load generator with a bounded reservoir of publish latencies"""
+
+    def __init__(self, reservoir_size: int = 100_000) -> None:
+        self.reservoir_size = reservoir_size
+        self.sent = 0
+        self.samples = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._seen = 0
+        self._window_start = time.monotonic()
+        self._window_sent = 0
+        self._window_samples = 0
+
+    def record_buffered(self) -> None:
+        with self._lock:
+            self.samples += 1
+            self._window_samples += 1
+
+    def record_sent(self) -> None:
+        with self._lock:
+            self.sent += 1
+            self.samples += 1
+            self._window_sent += 1
+            self._window_samples += 1
+
+    def record_failed(self) -> None:
+        with self._lock:
+            self.failed += 1
+
+    def record_latency(self, latency: float) -> None:
+        """Reservoir sampling keeps the memory flat on long runs"""
+        with self._lock:
+            self._seen += 1
+            if len(self._latencies) < self.reservoir_size:
+                self._latencies.append(latency)
+                return
+            index = random.randrange(self._seen)
+            if index < self.reservoir_size:
+                self._latencies[index] = latency
+
+    def snapshot(self) -> dict:
+        """Achieved rate and latency percentiles since the previous snapshot"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            window_sent = self._window_sent
+            window_samples = self._window_samples
+            latencies = sorted(self._latencies)
+            self._window_start = now
+            self._window_sent = 0
+            self._window_samples = 0
+            self._latencies = []
+            self._seen = 0
+            sent, samples, failed = self.sent, self.samples, self.failed
+
+        return {
+            "sent": sent,
+            "samples": samples,
+            "failed": failed,
+            "rate": window_sent / elapsed if elapsed > 0 else 0.0,
+            "sample_rate": window_samples / elapsed if elapsed > 0 else 0.0,
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+        }
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    """
+    Measures publish latency of one MQTT client up to PUBACK (QoS > 0).
+    Messages replayed from the spool are not measured, their mids are ignored.
+    """
+
+    def __init__(self, client, stats: PublishStats) -> None:
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._in_flight: Dict[int, float] = {}
+        self._acked_early: Dict[int, float] = {}
+        self._ignored: Set[int] = set()
+        client.on_publish = self.on_publish
+
+    def on_publish(self, client, userdata, mid):
+        now = time.perf_counter()
+        with self._lock:
+            if mid in self._ignored:
+                self._ignored.discard(mid)
+                return
+            started = self._in_flight.pop(mid, None)
+            if started is None:
+                # PUBACK arrived before publish() returned the mid
+                self._acked_early[mid] = now
+                return
+        self.stats.record_latency(now - started)
+
+    def published(self, mid: int, started: float) -> None:
+        with self._lock:
+            acked = self._acked_early.pop(mid, None)
+            if acked is None:
+                self._in_flight[mid] = started
+                return
+        self.stats.record_latency(acked - started)
+
+    def ignore(self, mid: int) -> None:
+        with self._lock:
+            if self._acked_early.pop(mid, None) is None:
+                self._ignored.add(mid)
+
+
+@dataclass
+class VirtualAgent:
+    user_id: int
+    datasource: Union[FileDatasource, RecordingDatasource]
+    scheduler: DeadlineScheduler
+    client_index: int
+    encoder: Union[JsonMessageEncoder, BatchMessageEncoder]
+
+
+class LoadGenerator:
+    """
+    Runs many virtual agents in one process.
+    Every agent has its own user_id, start offset into the recordings and rate,
+    all of them are driven by one scheduling loop ordered by the next deadline.
+    """
+
+    def __init__(
+        self,
+        clients,
+        topic,
+        agents: List[VirtualAgent],
+        qos=0,
+        drainers: Optional[List[SpoolDrainer]] = None,
+    ) -> None:
+        self.clients = clients
+        self.topic = topic
+        self.agents = agents
+        self.qos = qos
+        # One spool per client, failed messages are replayed through the same connection
+        self.drainers = drainers or []
+        self.stats = PublishStats()
+        self.trackers = (
+            [LatencyTracker(client, self.stats) for client in clients] if qos > 0 else []
+        )
+        for drainer, tracker in zip(self.drainers, self.trackers):
+            drainer.on_sent = tracker.ignore
+
+    @property
+    def target_rate(self) -> float:
+        return sum(1 / agent.scheduler.period for agent in self.agents)
+
+    def run(self, duration=0, report_interval=5):
+        for agent in self.agents:
+            agent.datasource.startReading()
+        # Opening the recordings is not part of the measured window
+        self.stats.snapshot()
+
+        start = clock()
+        # Agents are spread over the first period so they do not publish in bursts
+        for index, agent in enumerate(self.agents):
+            agent.scheduler.start(at=start + agent.scheduler.period * index / len(self.agents))
+        queue = [(agent.scheduler.next_deadline, index) for index, agent in enumerate(self.agents)]
+        heapq.heapify(queue)
+        next_report = start + report_interval
+        try:
+            while queue:
+                now = clock()
+                if duration and now - start >= duration:
+                    break
+                if now >= next_report:
+                    self.report()
+                    next_report += report_interval
+
+                due, index = queue[0]
+                if due > now:
+                    sleep_until(min(due, next_report))
+                    continue
+
+                agent = self.agents[index]
+                agent.scheduler.tick(now)
+                heapq.heapreplace(queue, (agent.scheduler.next_deadline, index))
+                self.publish(agent)
+        finally:
+            for agent in self.agents:
+                agent.datasource.stopReading()
+            self.report(final=True)
+
+    def publish(self, agent: VirtualAgent):
+        started = time.perf_counter()
+        msg = agent.encoder.add(agent.datasource.read())
+        if msg is None:
+            self.stats.record_buffered()
+            return
+        result = self.clients[agent.client_index].publish(self.topic, msg, qos=self.qos)
+        # Without a connection paho keeps a QoS > 0 message and sends it after the reconnect
+        if result.rc != 0 and (self.qos == 0 or result.rc != MQTT_ERR_NO_CONN):
+            self.stats.record_failed()
+            if self.drainers:
+                self.drainers[agent.client_index].spool.append(msg)
+            return
+        self.stats.record_sent()
+        if self.trackers:
+            self.trackers[agent.client_index].published(result.mid, started)
+        else:
+            self.stats.record_latency(time.perf_counter() - started)
+
+    def report(self, final=False):
+        snapshot = self.stats.snapshot()
+        latency = " ".join(
+            f"{name}={_format_ms(snapshot[name])}" for name in ("p50", "p95", "p99", "max")
+        )
+        schedulers = [agent.scheduler for agent in self.agents]
+        ticks = sum(scheduler.ticks for scheduler in schedulers)
+        lateness = (
+            f"skipped={sum(scheduler.skipped for scheduler in schedulers)} "
+            f"late={sum(scheduler.late for scheduler in schedulers)} "
+            f"lateness mean="
+            f"{_format_ms(sum(s.total_lateness for s in schedulers) / ticks if ticks else None)} "
+            f"max={_format_ms(max((s.max_lateness for s in schedulers), default=None))}"
+        )
+        print(
+            f"[load{' final' if final else ''}] agents={len(self.agents)} "
+            f"target={self.target_rate:.1f} samples/s achieved={snapshot['sample_rate']:.1f} samples/s "
+            f"({snapshot['rate']:.1f} msg/s) "
+            f"sent={snapshot['sent']} failed={snapshot['failed']} latency {latency} {lateness}"
+        )
+        if self.drainers:
+            spools = [drainer.stats() for drainer in self.drainers]
+            print(
+                f"[load{' final' if final else ''}] spool "
+                f"depth={sum(stats['depth'] for stats in spools)} "
+                f"bytes={sum(stats['bytes'] for stats in spools)} "
+                f"dropped={sum(stats['dropped'] for stats in spools)} "
+                f"drained={sum(stats['drained'] for stats in spools)} "
+                f"drain_rate={sum(stats['drain_rate'] for stats in spools):.1f} msg/s"
+            )
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.2f}ms"
+
+
+def build_agents(
+    count,
+    rates,
+    first_user_id=1,
+    offset_step=0,
+    clients_count=1,
+    accelerometer_filename="data/accelerometer.csv",
+    gps_filename="data/gps.csv",
+    recording_filename=None,
+    wire_format="json",
+    batch_size=1,
+    policy=CATCH_UP,
+    max_backlog=100,
+) -> List[VirtualAgent]:
+    """
+    Create virtual agents with consecutive user ids and shifted start offsets.
+    With a recording all agents share one memory mapping instead of opening the csv files each.
+    """
+
+    def make_datasource(user_id, start_offset):
+        if recording_filename:
+            return RecordingDatasource(recording_filename, user_id=user_id, start_offset=start_offset)
+        return FileDatasource(
+            accelerometer_filename, gps_filename, user_id=user_id, start_offset=start_offset
+        )
+
+    return [
+        VirtualAgent(
+            user_id=first_user_id + index,
+            datasource=make_datasource(first_user_id + index, index * offset_step),
+            scheduler=DeadlineScheduler(1 / rates[index % len(rates)], policy, max_backlog),
+            client_index=index % clients_count,
+            encoder=make_message_encoder(wire_format, batch_size),
+        )
+        for index in range(count)
+    ]
+
+
+def run_load_generator(clients, topic):
+    agents = build_agents(
+        config.LOAD_AGENTS,
+        config.LOAD_RATES,
+        first_user_id=config.LOAD_FIRST_USER_ID,
+        offset_step=config.LOAD_OFFSET_STEP,
+        clients_count=len(clients),
+        recording_filename=config.RECORDING_FILENAME,
+        wire_format=config.WIRE_FORMAT,
+        batch_size=config.BATCH_SIZE,
+        policy=config.CATCH_UP_POLICY,
+        max_backlog=config.MAX_BACKLOG,
+    )
+    drainers = None
+    if config.SPOOL_FILENAME:
+        drainers = [
+            start_spool(f"{config.SPOOL_FILENAME}.{index}", client, topic)
+            for index, client in enumerate(clients)
+        ]
+    generator = LoadGenerator(clients, topic, agents, qos=config.LOAD_QOS, drainers=drainers)
+    generator.run(duration=config.LOAD_DURATION, report_interval=config.LOAD_REPORT_INTERVAL)
@@ -1,8 +1,12 @@
 from paho.mqtt import client as mqtt_client
 import json
 import time
-from schema.aggregated_data_schema import AggregatedDataSchema
+from schema.message_encoder import make_message_encoder
 from file_datasource import FileDatasource
+from load_generator import run_load_generator
+from recording import RecordingDatasource
+from scheduler import DeadlineScheduler
+from spool import start_spool
 import config
 
 
@@ -24,29 +28,81 @@ def connect_mqtt(broker, port):
     return client
 
 
-def publish(client, topic, datasource, delay):
+def publish(client, topic, datasource, delay, drainer=None):
     datasource.startReading()
+    encoder = make_message_encoder(config.WIRE_FORMAT, config.BATCH_SIZE)
+    # Deadlines do not move with the time spent on reading and publishing
+    scheduler = DeadlineScheduler(delay, config.CATCH_UP_POLICY, config.MAX_BACKLOG)
+    next_report = time.monotonic() + config.REPORT_INTERVAL
     while True:
-        time.sleep(delay)
+        scheduler.wait()
+        if config.REPORT_INTERVAL and time.monotonic() >= next_report:
+            next_report += config.REPORT_INTERVAL
+            report_scheduler(scheduler)
+            if drainer:
+                report_spool(drainer)
         data = datasource.read()
-        msg = AggregatedDataSchema().dumps(data)
+        msg = encoder.add(data)
+        if msg is None:
+            # Sample is buffered until the batch is full
+            continue
         result = client.publish(topic, msg)
         # result: [0, 1]
         status = result[0]
         if status == 0:
             pass
             # print(f"Send `{msg}` to topic `{topic}`")
+        elif drainer:
+            # Keep the message until the broker accepts messages again
+            drainer.spool.append(msg)
         else:
             print(f"Failed to send message to topic {topic}")
 
 
+def report_scheduler(scheduler):
+    stats = scheduler.stats()
+    print(
+        f"target={stats['target_rate']:.1f} Hz achieved={stats['achieved_rate']:.1f} Hz "
+        f"ticks={stats['ticks']} skipped={stats['skipped']} late={stats['late']} "
+        f"lateness mean={stats['mean_lateness'] * 1000:.3f}ms max={stats['max_lateness'] * 1000:.3f}ms"
+    )
+
+
+def report_spool(drainer):
+    stats = drainer.stats()
+    print(
+        f"spool depth={stats['depth']} bytes={stats['bytes']} dropped={stats['dropped']} "
+        f"drained={stats['drained']} drain_rate={stats['drain_rate']:.1f} msg/s"
+    )
+
+
 def run():
+    if config.AGENT_MODE == "load":
+        run_load()
+        return
     # Prepare mqtt client
     client = connect_mqtt(config.MQTT_BROKER_HOST, config.MQTT_BROKER_PORT)
     # Prepare datasource
-    datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv")
+    if config.RECORDING_FILENAME:
+        datasource = RecordingDatasource(config.RECORDING_FILENAME)
+    else:
+        datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv")
+    # Replay messages the broker did not accept
+    drainer = None
+    if config.SPOOL_FILENAME:
+        drainer = start_spool(config.SPOOL_FILENAME, client, config.MQTT_TOPIC)
     # Infinity publish data
-    publish(client, config.MQTT_TOPIC, datasource, config.DELAY)
+    publish(client, config.MQTT_TOPIC, datasource, config.DELAY, drainer)
+
+
+def run_load():
+    # Prepare mqtt clients shared by the virtual agents
+    clients = [
+        connect_mqtt(config.MQTT_BROKER_HOST, config.MQTT_BROKER_PORT)
+        for _ in range(config.LOAD_CLIENTS)
+    ]
+    # Publish data of all virtual agents
+    run_load_generator(clients, config.MQTT_TOPIC)
 
 
 if __name__ == "__main__":
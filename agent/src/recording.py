@@ -0,0 +1,166 @@
+import argparse
+import csv
+import mmap
+import struct
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from domain.accelerometer import Accelerometer
+from domain.gps import Gps
+from domain.aggregated_data import AggregatedData
+import config
+
+# Layout of a recording file:
+#   header | accelerometer records | gps records
+# All records are fixed-width little-endian, so the sample with index i
+# is found at a computed offset without any parsing of the preceding data.
+MAGIC = b"RVREC\x00\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sHHQQ")  # magic, version, reserved, acc count, gps count
+ACC_RECORD = struct.Struct("<5i")  # x, y, z, air, noise
+GPS_RECORD = struct.Struct("<2d")  # longitude, latitude
+
+
+def convert_csv_to_recording(
+    accelerometer_filename: str, gps_filename: str, recording_filename: str
+) -> Tuple[int, int]:
+    """
+    Convert accelerometer.csv and gps.csv into one binary recording.
+    Rows are streamed, so the memory use does not depend on the size of the drive.
+    Returns:
+        (int, int): Number of accelerometer and gps records written.
+    """
+    with open(recording_filename, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+        acc_count = 0
+        with open(accelerometer_filename, "r") as acc_file:
+            for row in csv.DictReader(acc_file):
+                out.write(
+                    ACC_RECORD.pack(
+                        int(row["x"]), int(row["y"]), int(row["z"]), int(row["air"]), int(row["noise"])
+                    )
+                )
+                acc_count += 1
+
+        gps_count = 0
+        with open(gps_filename, "r") as gps_file:
+            for row in csv.DictReader(gps_file):
+                out.write(GPS_RECORD.pack(float(row["longitude"]), float(row["latitude"])))
+                gps_count += 1
+
+        if not acc_count or not gps_count:
+            raise ValueError("Recording needs at least one accelerometer and one gps row")
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, 0, acc_count, gps_count))
+    return acc_count, gps_count
+
+
+class Recording:
+    """Read-only memory-mapped recording shared by every datasource of the process"""
+
+    _opened: Dict[str, "Recording"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, recording_filename: str) -> None:
+        self.recording_filename = recording_filename
+        with open(recording_filename, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.acc_count, self.gps_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{recording_filename} is not a version {VERSION} recording")
+
+        self._acc_offset = HEADER.size
+        self._gps_offset = self._acc_offset + self.acc_count * ACC_RECORD.size
+        expected_size = self._gps_offset + self.gps_count * GPS_RECORD.size
+        if len(self._mmap) < expected_size:
+            self._mmap.close()
+            raise ValueError(f"{recording_filename} is truncated")
+
+    @classmethod
+    def open(cls, recording_filename: str) -> "Recording":
+        """Return the shared mapping of the file, mapping it on the first call"""
+        with cls._lock:
+            recording = cls._opened.get(recording_filename)
+            if recording is None:
+                recording = cls._opened[recording_filename] = cls(recording_filename)
+            return recording
+
+    def accelerometer(self, index: int) -> Tuple[int, int, int, int, int]:
+        return ACC_RECORD.unpack_from(
+            self._mmap, self._acc_offset + (index % self.acc_count) * ACC_RECORD.size
+        )
+
+    def gps(self, index: int) -> Tuple[float, float]:
+        return GPS_RECORD.unpack_from(
+            self._mmap, self._gps_offset + (index % self.gps_count) * GPS_RECORD.size
+        )
+
+
+class RecordingDatasource:
+    """
+    Datasource with the FileDatasource interface backed by a memory-mapped recording.
+    Both sensors wrap around independently, the same way FileDatasource rewinds its files.
+    """
+
+    def __init__(
+        self,
+        recording_filename: str,
+        user_id: int = config.USER_ID,
+        start_offset: int = 0,
+    ) -> None:
+        self.recording_filename = recording_filename
+        self.user_id = user_id
+        self.start_offset = start_offset
+
+        self.is_reading = False
+        self.recording: Optional[Recording] = None
+        self.index = start_offset
+
+    def read(self) -> AggregatedData:
+        """Return the next sample of the recording"""
+        if not self.is_reading:
+            raise RuntimeError("startReading() must be called before reading data")
+
+        data = self.read_at(self.index)
+        self.index += 1
+        return data
+
+    def read_at(self, index: int) -> AggregatedData:
+        """Return the sample with the given index without moving the cursor"""
+        if not self.recording:
+            raise RuntimeError("Recording not opened")
+
+        x, y, z, air, noise = self.recording.accelerometer(index)
+        longitude, latitude = self.recording.gps(index)
+        return AggregatedData(
+            accelerometer=Accelerometer(x=x, y=y, z=z, air=air, noise=noise),
+            gps=Gps(longitude=longitude, latitude=latitude),
+            timestamp=datetime.now(),
+            user_id=self.user_id,
+        )
+
+    def startReading(self, *args, **kwargs):
+        self.recording = Recording.open(self.recording_filename)
+        self.index = self.start_offset
+        self.is_reading = True
+
+    def stopReading(self, *args, **kwargs):
+        # The mapping is shared with other datasources and stays open
+        self.is_reading = False
+        self.recording = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert csv sensor data into a binary recording")
+    parser.add_argument("accelerometer", help="path to accelerometer.csv")
+    parser.add_argument("gps", help="path to gps.csv")
+    parser.add_argument("recording", help="path of the recording to write")
+    args = parser.parse_args()
+
+    acc_count, gps_count = convert_csv_to_recording(args.accelerometer, args.gps, args.recording)
+    print(f"Written {acc_count} accelerometer and {gps_count} gps records to {args.recording}")
@@ -0,0 +1,104 @@
+import time
+
+CATCH_UP = "catch_up"
+SKIP = "skip"
+POLICIES = (CATCH_UP, SKIP)
+
+# Below this much remaining time the scheduler spins instead of sleeping,
+# time.sleep wakes up too late for sub-millisecond periods
+SPIN_THRESHOLD = 0.0005
+
+clock = time.perf_counter
+
+
+def sleep_until(deadline: float, spin_threshold: float = SPIN_THRESHOLD) -> float:
+    """Sleep on the monotonic clock until deadline and return the wake up time"""
+    now = clock()
+    remaining = deadline - now
+    if remaining > spin_threshold:
+        time.sleep(remaining - spin_threshold)
+        now = clock()
+    while now < deadline:
+        now = clock()
+    return now
+
+
+class DeadlineScheduler:
+    """
+    Paces a loop at a fixed period with deadlines start + n * period.
+    Work done between ticks does not shift the following deadlines, so the rate does not drift.
+    When the loop falls behind:
+        catch_up - missed ticks run back to back, at most max_backlog of them,
+                   older ones are skipped;
+        skip     - missed ticks are skipped and the loop continues at the next slot.
+    """
+
+    def __init__(
+        self,
+        period: float,
+        policy: str = CATCH_UP,
+        max_backlog: int = 100,
+        spin_threshold: float = SPIN_THRESHOLD,
+    ) -> None:
+        if period <= 0:
+            raise ValueError("Period must be positive")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, expected one of {POLICIES}")
+        self.period = period
+        self.policy = policy
+        self.max_backlog = max(1, max_backlog)
+        self.spin_threshold = spin_threshold
+
+        self.started_at = None
+        self.next_deadline = None
+        self._slot = 0
+
+        self.ticks = 0
+        self.skipped = 0
+        self.late = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def start(self, at: float = None) -> None:
+        self.started_at = clock() if at is None else at
+        self.next_deadline = self.started_at
+        self._slot = 0
+
+    def wait(self) -> float:
+        """Block until the next deadline, returns how late the tick started in seconds"""
+        if self.next_deadline is None:
+            self.start()
+        return self.tick(sleep_until(self.next_deadline, self.spin_threshold))
+
+    def tick(self, now: float) -> float:
+        """Account a tick started at now and move to the next deadline"""
+        lateness = max(0.0, now - self.next_deadline)
+        self.ticks += 1
+        self.total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        if lateness >= self.period:
+            self.late += 1
+
+        self._slot += 1
+        behind = int((now - self.started_at) / self.period) - self._slot + 1
+        if behind > 0:
+            allowed = 0 if self.policy == SKIP else self.max_backlog
+            if behind > allowed:
+                self.skipped += behind - allowed
+                self._slot += behind - allowed
+        # Deadlines are computed from the start, rounding errors do not accumulate
+        self.next_deadline = self.started_at + self._slot * self.period
+        return lateness
+
+    def stats(self) -> dict:
+        elapsed = clock() - self.started_at if self.started_at is not None else 0.0
+        return {
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "late": self.late,
+            "target_rate": 1 / self.period,
+            "achieved_rate": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "mean_lateness": self.total_lateness / self.ticks if self.ticks else 0.0,
+            "max_lateness": self.max_lateness,
+        }
@@ -0,0 +1,46 @@
+import json
+import math
+
+from domain.aggregated_data import AggregatedData
+
+_int_repr = int.__repr__
+_float_repr = float.__repr__
+
+
+def _float(value) -> str:
+    value = float(value)
+    if math.isfinite(value):
+        return _float_repr(value)
+    # NaN and Infinity are written the way the json module writes them
+    return json.dumps(value)
+
+
+def dumps_aggregated_data(data: AggregatedData) -> str:
+    """
+    Serialize AggregatedData into the same JSON string as AggregatedDataSchema().dumps(data).
+    The field order, separators and number formatting of the schema are fixed here,
+    so no schema object is built and no fields are looked up per message.
+    """
+    acc = data.accelerometer
+    gps = data.gps
+    return (
+        '{"accelerometer": {"x": '
+        + _int_repr(int(acc.x))
+        + ', "y": '
+        + _int_repr(int(acc.y))
+        + ', "z": '
+        + _int_repr(int(acc.z))
+        + ', "air": '
+        + _int_repr(int(acc.air))
+        + ', "noise": '
+        + _int_repr(int(acc.noise))
+        + '}, "gps": {"longitude": '
+        + _float(gps.longitude)
+        + ', "latitude": '
+        + _float(gps.latitude)
+        + '}, "timestamp": "'
+        + data.timestamp.isoformat()
+        + '", "user_id": '
+        + _int_repr(int(data.user_id))
+        + "}"
+    )
@@ -0,0 +1,54 @@
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from domain.aggregated_data import AggregatedData
+
+# Batch of samples of one agent packed into one MQTT message:
+#   header | sample * count
+# The magic lets the edge tell a batch from a JSON document of older agents.
+MAGIC = b"RVAB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHi")  # magic, version, flags, count, user_id
+SAMPLE = struct.Struct("<q5i2d")  # timestamp, x, y, z, air, noise, longitude, latitude
+# Timestamps were timezone aware and are stored in UTC
+FLAG_UTC = 0x01
+MAX_SAMPLES = 0xFFFF
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_batch(samples: List[AggregatedData]) -> bytes:
+    """
+    Pack samples of one agent into a binary batch.
+    Timestamps are stored as microseconds since the epoch of their own wall clock,
+    so naive timestamps are restored exactly as the agent produced them.
+    """
+    if not samples or len(samples) > MAX_SAMPLES:
+        raise ValueError(f"Batch must contain 1..{MAX_SAMPLES} samples")
+
+    flags = FLAG_UTC if samples[0].timestamp.tzinfo is not None else 0
+    buffer = bytearray(HEADER.size + SAMPLE.size * len(samples))
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, flags, len(samples), samples[0].user_id)
+
+    offset = HEADER.size
+    for sample in samples:
+        timestamp = sample.timestamp
+        if flags & FLAG_UTC:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        acc = sample.accelerometer
+        SAMPLE.pack_into(
+            buffer,
+            offset,
+            (timestamp - EPOCH) // MICROSECOND,
+            acc.x,
+            acc.y,
+            acc.z,
+            acc.air,
+            acc.noise,
+            sample.gps.longitude,
+            sample.gps.latitude,
+        )
+        offset += SAMPLE.size
+    return bytes(buffer)
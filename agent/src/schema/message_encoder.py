@@ -0,0 +1,44 @@
+from typing import List, Optional, Union
+
+from domain.aggregated_data import AggregatedData
+from schema.aggregated_data_serializer import dumps_aggregated_data
+from schema.binary_batch import encode_batch
+
+
+class JsonMessageEncoder:
+    """One JSON document per sample, the format every edge understands"""
+
+    def add(self, data: AggregatedData) -> Optional[str]:
+        return dumps_aggregated_data(data)
+
+
+class BatchMessageEncoder:
+    """Collects batch_size samples and returns them as one binary batch"""
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.samples: List[AggregatedData] = []
+
+    def add(self, data: AggregatedData) -> Optional[bytes]:
+        self.samples.append(data)
+        if len(self.samples) < self.batch_size:
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[bytes]:
+        if not self.samples:
+            return None
+        msg = encode_batch(self.samples)
+        self.samples = []
+        return msg
+
+
+def make_message_encoder(
+    wire_format: str, batch_size: int
+) -> Union[JsonMessageEncoder, BatchMessageEncoder]:
+    """Return the encoder of the configured wire format ("json" or "binary")"""
+    if wire_format == "binary":
+        return BatchMessageEncoder(batch_size)
+    if wire_format == "json":
+        return JsonMessageEncoder()
+    raise ValueError(f"Unknown wire format: {wire_format}")
@@ -0,0 +1,263 @@
+import os
+import struct
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import config
+
+MAGIC = b"RVSPOOL1"
+# magic, capacity, head offset, used bytes, record count, sequence of the oldest record, dropped
+HEADER = struct.Struct("<8sQQQQQQ")
+RECORD = struct.Struct("<I")  # payload length
+
+
+class DiskSpool:
+    """
+    Bounded ring buffer of messages in a preallocated file.
+    Only the header fields live in memory, so the memory use stays flat however long
+    the broker is unreachable. When the file is full the oldest messages are dropped.
+    """
+
+    def __init__(self, filename: str, capacity: int, fsync: bool = False) -> None:
+        self.filename = filename
+        self.capacity = capacity
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        header = os.pread(self._fd, HEADER.size, 0)
+        if len(header) == HEADER.size and header[: len(MAGIC)] == MAGIC:
+            _, stored_capacity, self.head, self.used, self.count, self.head_seq, self.dropped = (
+                HEADER.unpack(header)
+            )
+            if stored_capacity != capacity:
+                os.close(self._fd)
+                raise ValueError(
+                    f"{filename} has capacity {stored_capacity}, {capacity} was configured"
+                )
+        else:
+            self.head = self.used = self.count = self.head_seq = self.dropped = 0
+            os.ftruncate(self._fd, HEADER.size + capacity)
+            self._write_header()
+
+    @property
+    def size(self) -> int:
+        """Bytes used by the spooled messages"""
+        return self.used
+
+    def append(self, payload) -> bool:
+        """Spool a message, returns False when it does not fit into the spool at all"""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        record_size = RECORD.size + len(payload)
+        with self._lock:
+            if record_size > self.capacity:
+                self.dropped += 1
+                self._write_header()
+                return False
+            while self.used + record_size > self.capacity:
+                self._drop_oldest()
+            tail = (self.head + self.used) % self.capacity
+            self._write(tail, RECORD.pack(len(payload)) + payload)
+            self.used += record_size
+            self.count += 1
+            self._write_header()
+        return True
+
+    def peek(self) -> Optional[Tuple[int, bytes]]:
+        """Return the sequence number and payload of the oldest message"""
+        with self._lock:
+            if not self.count:
+                return None
+            (length,) = RECORD.unpack(self._read(self.head, RECORD.size))
+            return self.head_seq, self._read((self.head + RECORD.size) % self.capacity, length)
+
+    def read(self, seq: int) -> Optional[bytes]:
+        """Return the payload of the message with this sequence number if it is still spooled"""
+        with self._lock:
+            index = seq - self.head_seq
+            if index < 0 or index >= self.count:
+                return None
+            offset = self.head
+            for _ in range(index):
+                (length,) = RECORD.unpack(self._read(offset, RECORD.size))
+                offset = (offset + RECORD.size + length) % self.capacity
+            (length,) = RECORD.unpack(self._read(offset, RECORD.size))
+            return self._read((offset + RECORD.size) % self.capacity, length)
+
+    def pop(self, seq: int) -> bool:
+        """Remove the oldest message if it is still the one peek() returned"""
+        with self._lock:
+            if not self.count or self.head_seq != seq:
+                return False
+            self._remove_oldest()
+            self._write_header()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _drop_oldest(self) -> None:
+        self._remove_oldest()
+        self.dropped += 1
+
+    def _remove_oldest(self) -> None:
+        (length,) = RECORD.unpack(self._read(self.head, RECORD.size))
+        record_size = RECORD.size + length
+        self.head = (self.head + record_size) % self.capacity
+        self.used -= record_size
+        self.count -= 1
+        self.head_seq += 1
+        if not self.count:
+            self.head = 0
+
+    def _write(self, offset: int, data: bytes) -> None:
+        """Write data at a ring offset, wrapping around the end of the data region"""
+        first = min(len(data), self.capacity - offset)
+        os.pwrite(self._fd, data[:first], HEADER.size + offset)
+        if first < len(data):
+            os.pwrite(self._fd, data[first:], HEADER.size)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        first = min(length, self.capacity - offset)
+        data = os.pread(self._fd, first, HEADER.size + offset)
+        if first < length:
+            data += os.pread(self._fd, length - first, HEADER.size)
+        return data
+
+    def _write_header(self) -> None:
+        os.pwrite(
+            self._fd,
+            HEADER.pack(
+                MAGIC, self.capacity, self.head, self.used, self.count, self.head_seq, self.dropped
+            ),
+            0,
+        )
+        if self.fsync:
+            os.fsync(self._fd)
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Replays spooled messages once the client is connected again.
+    Messages are sent at most max_rate per second and at most max_in_flight of them may
+    wait in the client's outgoing queue, so a reconnect does not flood the broker.
+    A message leaves the spool only once the client reports it published. paho drops its
+    outgoing queue on a reconnect, the messages in flight then are sent again.
+    on_sent, if set, is called with the mid of every replayed message.
+    """
+
+    def __init__(
+        self,
+        spool: DiskSpool,
+        client,
+        topic: str,
+        max_rate: float,
+        max_in_flight: int = 10,
+        qos: int = 0,
+        idle_interval: float = 0.5,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.spool = spool
+        self.client = client
+        self.topic = topic
+        self.interval = 1 / max_rate
+        self.max_in_flight = max_in_flight
+        self.qos = qos
+        self.idle_interval = idle_interval
+        self.on_sent: Optional[Callable[[int], None]] = None
+
+        self.drained = 0
+        # Sequence numbers and publish infos of the replayed messages, oldest first
+        self._in_flight: List[Tuple[int, object]] = []
+        self._disconnected = threading.Event()
+        self._stop_event = threading.Event()
+        self._window_start = time.monotonic()
+        self._window_drained = 0
+        client.on_disconnect = self.on_disconnect
+
+    def on_disconnect(self, client, userdata, rc):
+        # Called from the network thread, the drain loop resets its window
+        self._disconnected.set()
+
+    def run(self):
+        next_send = time.monotonic()
+        while not self._stop_event.is_set():
+            if self._disconnected.is_set():
+                self._disconnected.clear()
+                self._remove_published()
+                self._in_flight = []
+            if not self.spool.count or not self.client.is_connected():
+                self._stop_event.wait(self.idle_interval)
+                next_send = time.monotonic()
+                continue
+
+            self._remove_published()
+            # Backpressure: wait until the client actually sent the earlier messages
+            if len(self._in_flight) >= self.max_in_flight:
+                self._stop_event.wait(self.interval)
+                continue
+
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            next_send = max(next_send + self.interval, time.monotonic() - self.interval)
+
+            seq = self._in_flight[-1][0] + 1 if self._in_flight else self.spool.head_seq
+            payload = self.spool.read(seq)
+            if payload is None:
+                continue
+            info = self.client.publish(self.topic, payload, qos=self.qos)
+            if info.rc != 0:
+                # Broker went away again, the message stays spooled
+                self._stop_event.wait(self.idle_interval)
+                continue
+            if self.on_sent is not None:
+                self.on_sent(info.mid)
+            self._in_flight.append((seq, info))
+
+    def _remove_published(self):
+        # Messages the spool dropped for lack of space while they were in flight
+        while self._in_flight and self._in_flight[0][0] < self.spool.head_seq:
+            self._in_flight.pop(0)
+        while self._in_flight and self._in_flight[0][1].is_published():
+            seq, _ = self._in_flight.pop(0)
+            if self.spool.pop(seq):
+                self.drained += 1
+                self._window_drained += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self) -> dict:
+        """Spool depth and the drain rate since the previous call"""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        drain_rate = self._window_drained / elapsed if elapsed > 0 else 0.0
+        self._window_start = now
+        self._window_drained = 0
+        return {
+            "depth": self.spool.count,
+            "bytes": self.spool.size,
+            "dropped": self.spool.dropped,
+            "drained": self.drained,
+            "drain_rate": drain_rate,
+        }
+
+
+def start_spool(filename: str, client, topic: str) -> SpoolDrainer:
+    """Open the configured spool and start replaying it through the client"""
+    spool = DiskSpool(filename, config.SPOOL_CAPACITY)
+    drainer = SpoolDrainer(
+        spool,
+        client,
+        topic,
+        max_rate=config.SPOOL_DRAIN_RATE,
+        max_in_flight=config.SPOOL_MAX_IN_FLIGHT,
+    )
+    drainer.start()
+    return drainer
@@ -1,8 +1,18 @@
 import logging
+import threading
+import time
 import paho.mqtt.client as mqtt
+from app import metrics
 from app.interfaces.agent_gateway import AgentGateway
+from app.adapters.binary_batch import decode_batch, is_binary_batch
 from app.entities.agent_data import AgentData, GpsData
-from app.usecases.data_processing import process_agent_data
+from app.usecases.data_processing import (
+    process_agent_data,
+    process_agent_data_batch,
+    vehicle_states,
+)
+from app.usecases.ingest_queue import BLOCK, IngestQueue
+from app.usecases.summarizer import Summarizer
 from app.interfaces.hub_gateway import HubGateway
 
 
@@ -14,6 +24,10 @@ class AgentMQTTAdapter(AgentGateway):
         topic,
         hub_gateway: HubGateway,
         batch_size=10,
+        queue_size=10000,
+        overflow=BLOCK,
+        workers=2,
+        summarizer: Summarizer = None,
     ):
         self.batch_size = batch_size
         # MQTT
@@ -23,6 +37,14 @@ class AgentMQTTAdapter(AgentGateway):
         self.client = mqtt.Client()
         # Hub
         self.hub_gateway = hub_gateway
+        # Processed records wait here for the workers sending them to the hub,
+        # so a slow hub does not block the MQTT network thread
+        self.queue = IngestQueue(queue_size, overflow)
+        # Optional roll-up of normal samples, anomalies still go to the queue one by one
+        self.summarizer = summarizer
+        self.workers_count = workers
+        self.workers = []
+        self._stopping = threading.Event()
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
@@ -32,45 +54,158 @@ class AgentMQTTAdapter(AgentGateway):
             logging.info(f"Failed to connect to MQTT broker with code: {rc}")
 
     def on_message(self, client, userdata, msg):
-        """Processing agent data and sent it to hub gateway"""
+        """Processing agent data and queue it for the hub gateway"""
+        metrics.messages_received.inc()
         try:
-            payload: str = msg.payload.decode("utf-8")
-            # Create AgentData instance with the received data
-            agent_data = AgentData.model_validate_json(payload, strict=True)
-            # Process the received data (you can call a use case here if needed)
-            processed_data = process_agent_data(agent_data)
-            # Store the agent_data in the database (you can send it to the data processing module)
-            if not self.hub_gateway.save_data(processed_data):
-                logging.error("Hub is not available")
+            started = time.perf_counter()
+            if is_binary_batch(msg.payload):
+                # Batch of samples from an agent publishing the binary wire format
+                agent_data_batch = decode_batch(msg.payload)
+            else:
+                payload: str = msg.payload.decode("utf-8")
+                # Create AgentData instance with the received data
+                agent_data_batch = [AgentData.model_validate_json(payload, strict=True)]
+            decoded = time.perf_counter()
+            metrics.decode_seconds.observe(decoded - started)
+            metrics.samples_received.inc(len(agent_data_batch))
+            # Process the received data, a batch is classified as one window
+            if len(agent_data_batch) == 1:
+                processed_data_batch = [process_agent_data(agent_data_batch[0])]
+            else:
+                processed_data_batch = process_agent_data_batch(agent_data_batch)
+            classified = time.perf_counter()
+            metrics.classify_seconds.observe(classified - decoded)
+            # Classification stays on this thread, it keeps the samples of a vehicle in order
+            for processed_data in processed_data_batch:
+                if self.summarizer is None:
+                    self.queue.put(processed_data)
+                    continue
+                for forwarded_data in self.summarizer.add(processed_data):
+                    self.queue.put(forwarded_data)
+            metrics.enqueue_seconds.observe(time.perf_counter() - classified)
         except Exception as e:
+            metrics.message_errors.inc()
             logging.info(f"Error processing MQTT message: {e}")
 
+    def send_to_hub(self):
+        """Worker loop sending queued records to the hub until the adapter stops and the queue is empty"""
+        while True:
+            processed_data_batch = self.queue.get_batch(self.batch_size, timeout=1)
+            self.flush_summaries()
+            if not processed_data_batch:
+                if self._stopping.is_set():
+                    return
+                continue
+            self.save_to_hub(processed_data_batch)
+
+    def save_to_hub(self, processed_data_batch):
+        """Hand a batch to the hub gateway, timed and counted"""
+        started = time.perf_counter()
+        try:
+            # Store the agent_data in the database
+            if self.hub_gateway.save_batch(processed_data_batch):
+                metrics.hub_records_sent.inc(len(processed_data_batch))
+            else:
+                metrics.hub_errors.inc()
+                logging.error("Hub is not available")
+        except Exception as e:
+            metrics.hub_errors.inc()
+            logging.info(f"Error sending data to hub: {e}")
+        metrics.hub_handoff_seconds.observe(time.perf_counter() - started)
+
+    def flush_summaries(self, flush_all=False):
+        """Queue the summaries of the windows that are complete, or of every window"""
+        if self.summarizer is None:
+            return
+        if flush_all:
+            summaries = self.summarizer.flush_all()
+        else:
+            summaries = self.summarizer.flush_expired()
+        for summary in summaries:
+            self.queue.put(summary)
+
+    def register_metrics(self, metrics_registry: metrics.Registry = metrics.registry):
+        """Expose the queue, the vehicle state and the summarizer as scraped gauges"""
+        queue = self.queue
+        metrics_registry.gauge("edge_ingest_queue_depth", "Records waiting for the hub", lambda: len(queue))
+        metrics_registry.gauge("edge_ingest_queue_capacity", "Size of the ingest queue", lambda: queue.maxsize)
+        metrics_registry.counter_from(
+            "edge_ingest_queue_enqueued_total", "Records put into the ingest queue", lambda: queue.enqueued
+        )
+        for reason in ("oldest", "normal", "closed"):
+            metrics_registry.counter_from(
+                "edge_ingest_queue_dropped_total",
+                "Records dropped by the ingest queue overflow policy",
+                lambda reason=reason: getattr(queue, f"dropped_{reason}"),
+                reason=reason,
+            )
+        metrics_registry.counter_from(
+            "edge_ingest_queue_dropped_anomalies_total",
+            "Pothole and bump records among the dropped ones",
+            lambda: queue.dropped_anomalies,
+        )
+        metrics_registry.gauge(
+            "edge_vehicle_states", "Vehicles with classifier state", lambda: vehicle_states.stats()["vehicles"]
+        )
+        metrics_registry.counter_from(
+            "edge_vehicle_states_evicted_total",
+            "Vehicles whose classifier state was evicted",
+            lambda: vehicle_states.stats()["evicted"],
+        )
+        if self.summarizer is not None:
+            summarizer = self.summarizer
+            metrics_registry.gauge(
+                "edge_summary_open_windows", "Vehicles with an open summary window", lambda: len(summarizer)
+            )
+            metrics_registry.counter_from(
+                "edge_summaries_total", "Summary records created", lambda: summarizer.summaries
+            )
+            metrics_registry.counter_from(
+                "edge_summarized_samples_total",
+                "Normal samples rolled up into summaries",
+                lambda: summarizer.summarized,
+            )
+
     def connect(self):
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.connect(self.broker_host, self.broker_port, 60)
 
     def start(self):
+        self._stopping.clear()
+        self.workers = [
+            threading.Thread(target=self.send_to_hub, name=f"hub-worker-{index}", daemon=True)
+            for index in range(self.workers_count)
+        ]
+        for worker in self.workers:
+            worker.start()
         self.client.loop_start()
 
     def stop(self):
+        self.client.disconnect()
         self.client.loop_stop()
+        # Open windows are summarized now, not lost
+        self.flush_summaries(flush_all=True)
+        # Workers finish the records that are already queued
+        self._stopping.set()
+        self.queue.close()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
 
 
 # Usage example:
 if __name__ == "__main__":
+    import asyncio
+    from app.adapters.hub_http_adapter import HubHttpAdapter
+    from app.runtime import EdgeRuntime
+
     broker_host = "localhost"
     broker_port = 1883
     topic = "agent_data_topic"
-    # Assuming you have implemented the StoreGateway and passed it to the adapter
-    store_gateway = HubGateway()
-    adapter = AgentMQTTAdapter(broker_host, broker_port, topic, store_gateway)
-    adapter.connect()
-    adapter.start()
-    try:
-        # Keep the adapter running in the background
-        while True:
-            pass
-    except KeyboardInterrupt:
-        adapter.stop()
-        logging.info("Adapter stopped.")
+    # Any HubGateway implementation can be passed to the adapter
+    hub_gateway = HubHttpAdapter(api_base_url="http://localhost:8000")
+    # The runtime sends the queued records, the adapter starts no worker threads itself
+    adapter = AgentMQTTAdapter(broker_host, broker_port, topic, hub_gateway, workers=0)
+    # Runs until SIGINT/SIGTERM without keeping a CPU core busy
+    asyncio.run(EdgeRuntime(adapter, hub_gateway).run())
@@ -0,0 +1,53 @@
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+
+# Binary batch of one agent, see agent/src/schema/binary_batch.py:
+#   header | sample * count
+MAGIC = b"RVAB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHi")  # magic, version, flags, count, user_id
+SAMPLE = struct.Struct("<q5i2d")  # timestamp, x, y, z, air, noise, longitude, latitude
+FLAG_UTC = 0x01
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def is_binary_batch(payload: bytes) -> bool:
+    return payload[: len(MAGIC)] == MAGIC
+
+
+def decode_batch(payload: bytes) -> List[AgentData]:
+    """
+    Unpack a binary batch into AgentData.
+    The fields are typed by the layout itself, so models are constructed without
+    the JSON validation that a JSON message goes through.
+    """
+    if len(payload) < HEADER.size:
+        raise ValueError("Binary batch is shorter than its header")
+    magic, version, flags, count, user_id = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise ValueError("Payload is not a binary batch")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary batch version: {version}")
+    if len(payload) != HEADER.size + count * SAMPLE.size:
+        raise ValueError(f"Binary batch size does not match its {count} samples")
+
+    tzinfo = timezone.utc if flags & FLAG_UTC else None
+    agent_data_batch = []
+    for timestamp, x, y, z, air, noise, longitude, latitude in SAMPLE.iter_unpack(
+        memoryview(payload)[HEADER.size :]
+    ):
+        agent_data_batch.append(
+            AgentData.model_construct(
+                accelerometer=AccelerometerData.model_construct(
+                    x=float(x), y=float(y), z=float(z), air=float(air), noise=float(noise)
+                ),
+                gps=GpsData.model_construct(latitude=latitude, longitude=longitude),
+                timestamp=(EPOCH + timedelta(microseconds=timestamp)).replace(tzinfo=tzinfo),
+                user_id=user_id,
+            )
+        )
+    return agent_data_batch
@@ -1,29 +1,125 @@
+import gzip
 import logging
+import random
+import threading
+import time
+from typing import List, Optional
 
 import requests as requests
+from requests.adapters import HTTPAdapter
 
+from app import metrics
+from app.adapters.record_batcher import RecordBatcher
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
 
 
 class HubHttpAdapter(HubGateway):
-    def __init__(self, api_base_url):
+    """
+    Sends processed data to the Hub batch endpoint over a pooled keep-alive session.
+    Records are buffered and posted by a background thread when batch_size records
+    are collected or the oldest one waited linger seconds. Failed posts are retried
+    with jittered exponential backoff by that thread, so saving never waits for the Hub.
+    """
+
+    def __init__(
+        self,
+        api_base_url,
+        batch_size=100,
+        linger=0.5,
+        compress=False,
+        timeout=5,
+        max_retries=5,
+        backoff_base=0.5,
+        backoff_max=30,
+        max_pending=100000,
+    ):
         self.api_base_url = api_base_url
+        self.compress = compress
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # One kept-alive connection is reused by the sending thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._closing = threading.Event()
+        self._deadline: Optional[float] = None
+        self.batcher = RecordBatcher(
+            self._post_with_retry, batch_size, linger, max_pending, name="hub-http"
+        )
 
     def save_data(self, processed_data: ProcessedAgentData):
         """
-        Save the processed road data to the Hub.
+        Queue the processed road data for the Hub.
         Parameters:
             processed_data (ProcessedAgentData): Processed road data to be saved.
         Returns:
-            bool: True if the data is successfully saved, False otherwise.
+            bool: True if the data is queued, False if the adapter is closed.
         """
-        url = f"{self.api_base_url}/processed_agent_data/"
+        return self.batcher.add([processed_data])
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        return self.batcher.add(processed_data_batch)
+
+    def register_metrics(self):
+        self.batcher.register_metrics()
 
-        response = requests.post(url, data=processed_data.model_dump_json())
+    def close(self, timeout: Optional[float] = None):
+        """Post the buffered records within timeout seconds and stop the background thread"""
+        # Backoff waits are cut short, the remaining records get their attempts right away,
+        # and no request outlasts the deadline
+        if timeout is not None:
+            self._deadline = time.monotonic() + timeout
+        self._closing.set()
+        self.batcher.close(timeout)
+        self.session.close()
+
+    def _post_with_retry(self, batch: List[ProcessedAgentData]):
+        # The body is serialized once, for every attempt and for the error log
+        body = ("[" + ",".join(item.model_dump_json() for item in batch) + "]").encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.max_retries + 1):
+            timeout = self.timeout
+            if self._deadline is not None:
+                timeout = min(timeout, self._deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+            if attempt > 0:
+                metrics.hub_send_retries.inc()
+            started = time.perf_counter()
+            posted = self._post(body, headers, len(batch), timeout)
+            metrics.hub_send_seconds.observe(time.perf_counter() - started)
+            if posted:
+                metrics.hub_batches_delivered.inc()
+                metrics.hub_records_delivered.inc(len(batch))
+                return
+            metrics.hub_send_failures.inc()
+            if attempt < self.max_retries:
+                # Full jitter keeps many edges from retrying in lockstep
+                self._closing.wait(
+                    random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+                )
+        metrics.hub_batches_dropped.inc()
+        metrics.hub_records_dropped.inc(len(batch))
+        logging.error(f"Hub did not accept a batch of {len(batch)} records, batch dropped")
+
+    def _post(self, body: bytes, headers: dict, count: int, timeout: float) -> bool:
+        url = f"{self.api_base_url}/processed_agent_data/batch/"
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            logging.info(f"Hub request failed: {e}")
+            return False
         if response.status_code != 200:
-            logging.info(
-                f"Invalid Hub response\nData: {processed_data.model_dump_json()}\nResponse: {response}"
-            )
+            logging.info(f"Invalid Hub response\nRecords: {count}\nResponse: {response}")
             return False
         return True
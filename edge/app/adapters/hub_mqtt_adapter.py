@@ -1,18 +1,55 @@
 import logging
+import threading
+import time
+from typing import List, Optional
 
-import requests as requests
 from paho.mqtt import client as mqtt_client
 
+from app import metrics
+from app.adapters.record_batcher import RecordBatcher
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
 
 
 class HubMqttAdapter(HubGateway):
-    def __init__(self, broker, port, topic):
+    """
+    Publishes processed data to the Hub topic.
+    With batch_size > 1 records are packed into one JSON array message, sent when the
+    batch is full or its oldest record waited linger seconds. At most max_in_flight
+    messages may be unconfirmed by the client (written to the socket for QoS 0,
+    acknowledged by the broker for QoS 1/2); further publishes wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        broker,
+        port,
+        topic,
+        batch_size=1,
+        linger=0.1,
+        qos=0,
+        max_in_flight=100,
+        publish_timeout=10,
+    ):
         self.broker = broker
         self.port = port
         self.topic = topic
+        self.qos = qos
+        self.publish_timeout = publish_timeout
+
+        self.published = 0
+        self.failed = 0
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._window = threading.Condition()
+
         self.mqtt_client = self._connect_mqtt(broker, port)
+        self.mqtt_client.on_publish = self._on_publish
+        self.mqtt_client.on_disconnect = self._on_disconnect
+
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = RecordBatcher(self._publish_batch, batch_size, linger, name="hub-mqtt")
 
     def save_data(self, processed_data: ProcessedAgentData):
         """
@@ -20,17 +57,92 @@ class HubMqttAdapter(HubGateway):
         Parameters:
             processed_data (ProcessedAgentData): Processed road data to be saved.
         Returns:
-            bool: True if the data is successfully saved, False otherwise.
+            bool: True if the data is published or queued for a batch, False otherwise.
         """
-        msg = processed_data.model_dump_json()
-        result = self.mqtt_client.publish(self.topic, msg)
+        if self.batcher is not None:
+            return self.batcher.add([processed_data])
+        return self._publish(processed_data.model_dump_json(), 1)
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        if self.batcher is not None:
+            return self.batcher.add(processed_data_batch)
+        return super().save_batch(processed_data_batch)
+
+    def register_metrics(self):
+        """Expose the in-flight window and the batch buffer as scraped gauges"""
+        metrics.registry.gauge(
+            "edge_hub_mqtt_in_flight", "Hub messages published and not yet confirmed", lambda: self.in_flight
+        )
+        if self.batcher is not None:
+            self.batcher.register_metrics()
+
+    def close(self, timeout: Optional[float] = None):
+        if self.batcher is not None:
+            self.batcher.close(timeout)
+        self.mqtt_client.disconnect()
+        self.mqtt_client.loop_stop()
+
+    def _publish_batch(self, batch: List[ProcessedAgentData]):
+        msg = "[" + ",".join(item.model_dump_json() for item in batch) + "]"
+        if not self._publish(msg, len(batch)):
+            logging.error(f"Hub did not accept a batch of {len(batch)} records")
+
+    def _publish(self, msg: str, count: int) -> bool:
+        """Publish a message of count records, counted and timed including the wait for a slot"""
+        started = time.perf_counter()
+        published = self._publish_in_window(msg)
+        metrics.hub_send_seconds.observe(time.perf_counter() - started)
+        if published:
+            metrics.hub_batches_delivered.inc()
+            metrics.hub_records_delivered.inc(count)
+        else:
+            metrics.hub_send_failures.inc()
+            metrics.hub_batches_dropped.inc()
+            metrics.hub_records_dropped.inc(count)
+        return published
+
+    def _publish_in_window(self, msg: str) -> bool:
+        # Backpressure: wait for a free slot of the in-flight window
+        with self._window:
+            if not self._window.wait_for(
+                lambda: self.in_flight < self.max_in_flight, timeout=self.publish_timeout
+            ):
+                self.failed += 1
+                logging.error(f"No free in-flight slot for topic {self.topic}")
+                return False
+            self.in_flight += 1
+        result = self.mqtt_client.publish(self.topic, msg, qos=self.qos)
         status = result[0]
         if status == 0:
+            self.published += 1
+            return True
+        elif self.qos > 0 and status == mqtt_client.MQTT_ERR_NO_CONN:
+            # Kept by the client and sent after the reconnect, its slot is released
+            # by on_publish once the broker acknowledges it
+            self.published += 1
+            logging.warning(f"Queued message for topic {self.topic} until the reconnect")
             return True
         else:
+            # Discarded by the client, no on_publish will come for it
+            self._release_slots(1)
+            self.failed += 1
             print(f"Failed to send message to topic {self.topic}")
             return False
 
+    def _on_publish(self, client, userdata, mid):
+        self._release_slots(1)
+
+    def _on_disconnect(self, client, userdata, rc):
+        # Unsent QoS 0 messages are discarded by the client and never confirmed,
+        # QoS 1/2 messages are resent after the reconnect and keep their slots
+        if self.qos == 0:
+            self._release_slots(self.in_flight)
+
+    def _release_slots(self, count: int):
+        with self._window:
+            self.in_flight = max(0, self.in_flight - count)
+            self._window.notify_all()
+
     @staticmethod
     def _connect_mqtt(broker, port):
         """Create MQTT client"""
@@ -0,0 +1,53 @@
+import logging
+import multiprocessing.util
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+
+# Gateway of a pool process, made by the process initializer
+_process_gateway: Optional[HubGateway] = None
+
+
+def _start_process(make_gateway: Callable[[], HubGateway], close_timeout: float):
+    global _process_gateway
+    # Ctrl+C reaches the whole process group, the edge process decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _process_gateway = make_gateway()
+    # Runs as the pool shuts the process down, records batched in it are flushed
+    multiprocessing.util.Finalize(None, _process_gateway.close, args=(close_timeout,), exitpriority=10)
+
+
+def _save_batch(processed_data_batch: List[ProcessedAgentData]) -> bool:
+    return _process_gateway.save_batch(processed_data_batch)
+
+
+class ProcessPoolHubGateway(HubGateway):
+    """
+    Sends processed data to the Hub from a pool of processes, every one with its own
+    gateway made by make_gateway (a module level function, it is pickled), so
+    serializing, compressing and sending batches does not compete for the GIL of the
+    edge process. A call blocks until a process handled the batch, the hub workers of
+    the edge keep the processes busy.
+    """
+
+    def __init__(self, make_gateway: Callable[[], HubGateway], processes: int = 2, close_timeout: float = 30):
+        self.executor = ProcessPoolExecutor(
+            processes, initializer=_start_process, initargs=(make_gateway, close_timeout)
+        )
+
+    def save_data(self, processed_data: ProcessedAgentData) -> bool:
+        return self.save_batch([processed_data])
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        try:
+            return self.executor.submit(_save_batch, processed_data_batch).result()
+        except Exception as e:
+            logging.error(f"Hub gateway process failed: {e!r}")
+            return False
+
+    def close(self, timeout: Optional[float] = None):
+        # Every process flushes its gateway within close_timeout as it exits
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+import logging
+from typing import Callable, Deque, List, Optional
+
+from app import metrics
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+class RecordBatcher:
+    """
+    Buffers processed records and hands them to send(batch) from a background thread
+    when batch_size records are collected or the oldest one waited linger seconds.
+    At most max_pending records are buffered, beyond that the oldest ones are dropped.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[ProcessedAgentData]], None],
+        batch_size: int,
+        linger: float,
+        max_pending: int = 100000,
+        name: str = "record-batcher",
+    ) -> None:
+        self.send = send
+        self.name = name
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_pending = max_pending
+
+        self.dropped = 0
+        self._pending: Deque[ProcessedAgentData] = deque()
+        self._oldest_at = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._send_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, records: List[ProcessedAgentData]) -> bool:
+        """Buffer records, returns False once the batcher is closed"""
+        with self._condition:
+            if self._closed:
+                return False
+            if not self._pending:
+                self._oldest_at = time.monotonic()
+            self._pending.extend(records)
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def register_metrics(self, metrics_registry: metrics.Registry = metrics.registry):
+        """Expose the buffer as scraped gauges"""
+        metrics_registry.gauge(
+            "edge_hub_buffer_pending",
+            "Records buffered for the next hub batches",
+            lambda: len(self),
+            batcher=self.name,
+        )
+        metrics_registry.gauge(
+            "edge_hub_buffer_capacity",
+            "Records the hub buffer holds at most",
+            lambda: self.max_pending,
+            batcher=self.name,
+        )
+        metrics_registry.counter_from(
+            "edge_hub_buffer_dropped_total",
+            "Records dropped by a full hub buffer or on close",
+            lambda: self.dropped,
+            batcher=self.name,
+        )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Send what is still buffered within timeout seconds and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            with self._condition:
+                dropped = len(self._pending)
+                self.dropped += dropped
+                self._pending.clear()
+            logging.error(f"{self._thread.name} did not finish in time, {dropped} records dropped")
+
+    def _send_loop(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._batch_ready():
+                    timeout = None
+                    if self._pending:
+                        timeout = self._oldest_at + self.linger - time.monotonic()
+                    self._condition.wait(timeout)
+                if self._closed and not self._pending:
+                    return
+                batch = [
+                    self._pending.popleft()
+                    for _ in range(min(self.batch_size, len(self._pending)))
+                ]
+                self._oldest_at = time.monotonic() if self._pending else None
+            self.send(batch)
+
+    def _batch_ready(self) -> bool:
+        if len(self._pending) >= self.batch_size:
+            return True
+        return bool(self._pending) and time.monotonic() - self._oldest_at >= self.linger
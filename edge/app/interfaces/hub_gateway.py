@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 from app.entities.processed_agent_data import ProcessedAgentData
 
 
@@ -18,3 +19,31 @@ class HubGateway(ABC):
             bool: True if the data is successfully saved, False otherwise.
         """
         pass
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        """
+        Method to save several processed agent data records.
+        Adapters that can send records together override it.
+        Parameters:
+            processed_data_batch (List[ProcessedAgentData]): The processed agent data to be saved.
+        Returns:
+            bool: True if all records are successfully saved, False otherwise.
+        """
+        saved = True
+        for processed_data in processed_data_batch:
+            saved = self.save_data(processed_data) and saved
+        return saved
+
+    def register_metrics(self):
+        """
+        Method to expose the buffers of the gateway as metrics, gateways without any keep it.
+        """
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Method to flush pending data and release the connections of the gateway.
+        Parameters:
+            timeout (float): Seconds the flush may take at most, data still pending then is dropped.
+        """
+        pass
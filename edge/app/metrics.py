@@ -0,0 +1,220 @@
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Upper bounds in seconds of the stage timing buckets, from 10 µs to 5 s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Dict[str, str] = None) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels)} {self.value}"]
+
+
+class Gauge:
+    """
+    Value read from a callback when the metrics are scraped, free on the hot path.
+    With kind "counter" it exposes a count kept elsewhere, e.g. the drops of a queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], float],
+        labels: Dict[str, str] = None,
+        kind: str = "gauge",
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.read = read
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels)} {self.read()}"]
+
+
+class Histogram:
+    """Distribution of observed durations in fixed cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Dict[str, str] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += bucket_count
+            labels = _format_labels({**self.labels, "le": str(bound)})
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics of the process, rendered in the Prometheus text exposition format"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            family = self._metrics.setdefault(metric.name, [])
+            if family and family[0].kind != metric.kind:
+                raise ValueError(f"Metric {metric.name} is already registered as a {family[0].kind}")
+            family.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], **labels) -> Gauge:
+        return self.register(Gauge(name, help, read, labels))
+
+    def counter_from(self, name: str, help: str, read: Callable[[], float], **labels) -> Gauge:
+        return self.register(Gauge(name, help, read, labels, kind="counter"))
+
+    def histogram(self, name: str, help: str, **labels) -> Histogram:
+        return self.register(Histogram(name, help, labels))
+
+    def render(self) -> str:
+        with self._lock:
+            families = [list(family) for family in self._metrics.values()]
+        lines = []
+        for family in families:
+            first = family[0]
+            lines.append(f"# HELP {first.name} {first.help}")
+            lines.append(f"# TYPE {first.name} {first.kind}")
+            for metric in family:
+                try:
+                    lines.extend(metric.samples())
+                except Exception as e:
+                    logging.info(f"Error reading metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Edge pipeline: AgentMQTTAdapter -> process_agent_data -> HubGateway
+messages_received = registry.counter("edge_messages_received_total", "Agent MQTT messages received")
+samples_received = registry.counter("edge_samples_received_total", "Agent samples decoded from the messages")
+message_errors = registry.counter("edge_message_errors_total", "Agent MQTT messages that failed processing")
+hub_records_sent = registry.counter(
+    "edge_hub_records_sent_total", "Records the hub gateway accepted, sent or buffered for a batch"
+)
+hub_errors = registry.counter("edge_hub_errors_total", "Hub gateway calls that failed or were refused")
+STAGE_HELP = "Time spent in a stage of the edge pipeline"
+decode_seconds = registry.histogram("edge_stage_seconds", STAGE_HELP, stage="decode")
+classify_seconds = registry.histogram("edge_stage_seconds", STAGE_HELP, stage="classify")
+enqueue_seconds = registry.histogram("edge_stage_seconds", STAGE_HELP, stage="enqueue")
+# Time of the hub gateway call: the request with a direct gateway, the hand-off to the
+# local buffer with a batching one, whose sends happen on its own thread
+hub_handoff_seconds = registry.histogram("edge_stage_seconds", STAGE_HELP, stage="hub_handoff")
+# One POST or publish of a batch to the hub, made by the gateway after the hand-off
+hub_send_seconds = registry.histogram("edge_stage_seconds", STAGE_HELP, stage="hub_send")
+hub_batches_delivered = registry.counter("edge_hub_batches_delivered_total", "Batches the hub accepted")
+hub_records_delivered = registry.counter(
+    "edge_hub_records_delivered_total", "Records in the batches the hub accepted"
+)
+hub_send_failures = registry.counter("edge_hub_send_failures_total", "Hub requests or publishes that failed")
+hub_send_retries = registry.counter("edge_hub_send_retries_total", "Hub requests repeated after a failure")
+hub_batches_dropped = registry.counter(
+    "edge_hub_batches_dropped_total", "Batches given up after their last attempt"
+)
+hub_records_dropped = registry.counter(
+    "edge_hub_records_dropped_total", "Records in the batches given up after their last attempt"
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = registry
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line each
+        pass
+
+
+class MetricsServer:
+    """Serves GET /metrics of a registry from a background thread"""
+
+    def __init__(self, host: str, port: int, metrics_registry: Optional[Registry] = None) -> None:
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": metrics_registry or registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"Serving metrics on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import signal
+import time
+from typing import List
+
+from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
+from app.interfaces.hub_gateway import HubGateway
+
+
+class EdgeRuntime:
+    """
+    Event-driven edge process.
+    Owns the agent MQTT subscription and the hub gateway and runs the hub delivery
+    workers as asyncio tasks. The main thread sleeps in the event loop until SIGINT or
+    SIGTERM, then intake stops, queued records are delivered and the gateway is closed.
+    """
+
+    def __init__(
+        self,
+        agent_adapter: AgentMQTTAdapter,
+        hub_gateway: HubGateway,
+        workers: int = 2,
+        shutdown_timeout: float = 30,
+    ) -> None:
+        self.agent_adapter = agent_adapter
+        self.hub_gateway = hub_gateway
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self._stopping = asyncio.Event()
+        self._draining = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except NotImplementedError:
+                # No signal handlers in this event loop, Ctrl+C still cancels run()
+                pass
+
+        # Connect to the MQTT broker and start listening for messages
+        self.agent_adapter.connect()
+        self.agent_adapter.start()
+        tasks: List[asyncio.Task] = [
+            asyncio.create_task(self._send_to_hub(), name=f"hub-worker-{index}")
+            for index in range(self.workers)
+        ]
+        if self.agent_adapter.summarizer is not None:
+            tasks.append(asyncio.create_task(self._flush_summaries(), name="summary-flusher"))
+        try:
+            await self._stopping.wait()
+        finally:
+            await self._shutdown(tasks)
+
+    def stop(self):
+        logging.info("Stopping edge runtime")
+        self._stopping.set()
+
+    async def _send_to_hub(self):
+        """Deliver queued records until intake stopped and the queue is drained"""
+        queue = self.agent_adapter.queue
+        batch_size = self.agent_adapter.batch_size
+        while True:
+            processed_data_batch = await asyncio.to_thread(queue.get_batch, batch_size, 1)
+            if not processed_data_batch:
+                if self._draining:
+                    return
+                continue
+            await asyncio.to_thread(self.agent_adapter.save_to_hub, processed_data_batch)
+
+    async def _flush_summaries(self):
+        """Close the summary windows of vehicles that went quiet"""
+        # A window is closed at most a tenth of its length late
+        interval = self.agent_adapter.summarizer.window / 10
+        while not self._stopping.is_set():
+            await asyncio.to_thread(self.agent_adapter.flush_summaries)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _stop_intake(self):
+        # The MQTT network thread may be blocked on a full queue, only the workers make
+        # room, so the adapter stops on another thread while they keep running
+        await asyncio.to_thread(self.agent_adapter.stop)
+        # No new messages, the workers drain what is already queued
+        self._draining = True
+
+    async def _shutdown(self, tasks: List[asyncio.Task]):
+        started = time.monotonic()
+        intake = asyncio.create_task(self._stop_intake(), name="intake-stop")
+        done, pending = await asyncio.wait([intake, *tasks], timeout=self.shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Producers still waiting for room give up, the network thread can exit
+            self.agent_adapter.queue.close()
+            logging.error(
+                f"Shutdown timed out, {len(self.agent_adapter.queue)} records were not delivered"
+            )
+        # Flushing the gateway counts against the same shutdown_timeout
+        remaining = max(0.0, self.shutdown_timeout - (time.monotonic() - started))
+        await asyncio.to_thread(self.hub_gateway.close, remaining)
+        logging.info("System stopped.")
@@ -0,0 +1,148 @@
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.usecases.signal_features import SignalFeatures
+from app.usecases.vehicle_state import ColumnSpec
+
+THRESHOLD_POTHOLE = 1000
+THRESHOLD_BUMP = 800
+
+# Road states in the order of the codes returned by the classifiers
+ROAD_STATES = ["normal", "pothole", "bump"]
+NORMAL, POTHOLE, BUMP = range(len(ROAD_STATES))
+
+
+class Classifier(ABC):
+    """
+    Abstract class representing a road state classifier.
+    A classifier declares the per-vehicle state it needs as vehicle state columns and
+    classifies the z values of one vehicle in arrival order, updating that state.
+    The caller holds the lock of the vehicle's state table.
+    """
+
+    columns: ColumnSpec = {}
+
+    @abstractmethod
+    def classify_sample(self, z: float, columns: Dict[str, np.ndarray], slot: int) -> int:
+        """
+        Method to classify the next z value of a vehicle.
+        Parameters:
+            z (float): z value of the sample.
+            columns (Dict[str, np.ndarray]): State columns of the vehicle's table.
+            slot (int): Slot of the vehicle in the table.
+        Returns:
+            int: Road state code (index into ROAD_STATES).
+        """
+        pass
+
+    def classify_window(self, z: np.ndarray, columns: Dict[str, np.ndarray], slot: int) -> np.ndarray:
+        """
+        Method to classify consecutive z values of a vehicle at once.
+        Classifiers that can work on the whole window vectorized override it.
+        Returns:
+            np.ndarray: Road state code of every value.
+        """
+        return np.fromiter(
+            (self.classify_sample(value, columns, slot) for value in z.tolist()),
+            dtype=np.int64,
+            count=len(z),
+        )
+
+
+def classify_z_window(z: np.ndarray, prev_z: Optional[float]) -> np.ndarray:
+    """
+    Classify a window of consecutive z values at once.
+    Gives the same decisions as calling process_agent_data for every value in order.
+    Parameters:
+        z (np.ndarray): z values of the window in arrival order.
+        prev_z (Optional[float]): z value preceding the window, None if there is none.
+    Returns:
+        np.ndarray: Road state code (index into ROAD_STATES) of every value.
+    """
+    prev = np.empty_like(z)
+    prev[1:] = z[:-1]
+    prev[0] = z[0] if prev_z is None else prev_z
+    has_prev = np.ones(len(z), dtype=bool)
+    has_prev[0] = prev_z is not None
+
+    z_diff = z - prev
+    pothole = z_diff < -THRESHOLD_POTHOLE
+    bump = (z_diff > THRESHOLD_BUMP) & has_prev & (prev > z)
+    return np.where(pothole, POTHOLE, np.where(bump, BUMP, NORMAL))
+
+
+class ZDiffClassifier(Classifier):
+    """Thresholds on the difference between consecutive z values"""
+
+    columns: ColumnSpec = {"last_z": (np.float64, ()), "has_prev": (np.bool_, ())}
+
+    def classify_sample(self, z: float, columns: Dict[str, np.ndarray], slot: int) -> int:
+        last_z = columns["last_z"]
+        has_prev = columns["has_prev"]
+        seen_before = bool(has_prev[slot])
+        prev_z = float(last_z[slot]) if seen_before else z
+        last_z[slot] = z
+        has_prev[slot] = True
+
+        z_diff = z - prev_z
+        if z_diff < -THRESHOLD_POTHOLE:
+            return POTHOLE
+        if z_diff > THRESHOLD_BUMP and seen_before and prev_z > z:
+            return BUMP
+        return NORMAL
+
+    def classify_window(self, z: np.ndarray, columns: Dict[str, np.ndarray], slot: int) -> np.ndarray:
+        last_z = columns["last_z"]
+        has_prev = columns["has_prev"]
+        prev_z = float(last_z[slot]) if has_prev[slot] else None
+        last_z[slot] = z[-1]
+        has_prev[slot] = True
+        return classify_z_window(z, prev_z)
+
+
+class FeatureClassifier(Classifier):
+    """
+    Jerk thresholds confirmed by the rolling signal features.
+    A jump of z past the pothole (downwards) or bump (upwards) threshold is only an
+    anomaly if the peak-to-peak of the shortest window stands out spike_ratio times
+    from the standard deviation of the longest one, so a road that is rough all along
+    does not report every jolt. Until the longest window is filled the jerk decides alone.
+    """
+
+    def __init__(self, windows: Sequence[int] = (16, 64), spike_ratio: float = 4.0) -> None:
+        self.features = SignalFeatures(windows)
+        self.columns = self.features.columns
+        self.spike_ratio = spike_ratio
+        self.long_window = self.features.windows[-1]
+        self.peak_to_peak = self.features.index[f"peak_to_peak_{self.features.windows[0]}"]
+        self.variance = self.features.index[f"variance_{self.long_window}"]
+        self.jerk = self.features.index["jerk"]
+
+    def classify_sample(self, z: float, columns: Dict[str, np.ndarray], slot: int) -> int:
+        features = self.features.update(columns, slot, z)
+        jerk = features[self.jerk]
+        if jerk >= -THRESHOLD_POTHOLE and jerk <= THRESHOLD_BUMP:
+            return NORMAL
+        if self.features.count(columns, slot) >= self.long_window:
+            spread = math.sqrt(features[self.variance])
+            if features[self.peak_to_peak] <= self.spike_ratio * spread:
+                return NORMAL
+        return POTHOLE if jerk < 0 else BUMP
+
+
+CLASSIFIERS = {
+    "zdiff": ZDiffClassifier,
+    "features": FeatureClassifier,
+}
+
+
+def make_classifier(name: str, **options) -> Classifier:
+    """Create the classifier registered under name, options go to its constructor"""
+    try:
+        classifier_class = CLASSIFIERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown classifier {name}, expected one of {tuple(CLASSIFIERS)}")
+    return classifier_class(**options)
@@ -1,10 +1,34 @@
-from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
 from app.entities.agent_data import AgentData
 from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.classifier import ROAD_STATES, Classifier, make_classifier
+from app.usecases.vehicle_state import ShardedVehicleStates
+from config import (
+    CLASSIFIER,
+    FEATURE_SPIKE_RATIO,
+    FEATURE_WINDOWS,
+    VEHICLE_STATE_CAPACITY,
+    VEHICLE_STATE_SHARDS,
+    VEHICLE_STATE_TTL,
+)
+
+# Per-classifier constructor options from the configuration
+CLASSIFIER_OPTIONS = {
+    "features": {"windows": FEATURE_WINDOWS, "spike_ratio": FEATURE_SPIKE_RATIO},
+}
+classifier: Classifier = make_classifier(CLASSIFIER, **CLASSIFIER_OPTIONS.get(CLASSIFIER, {}))
+
+# Classifier state of every vehicle, keyed by user_id
+vehicle_states = ShardedVehicleStates(
+    shards=VEHICLE_STATE_SHARDS,
+    capacity=VEHICLE_STATE_CAPACITY,
+    ttl=VEHICLE_STATE_TTL,
+    columns=classifier.columns,
+)
 
-z_history = deque(maxlen=5)
-THRESHOLD_POTHOLE = 1000
-THRESHOLD_BUMP = 800
 
 def process_agent_data(
     agent_data: AgentData,
@@ -17,28 +41,49 @@ def process_agent_data(
         processed_data_batch (ProcessedAgentData): Processed data containing the classified state of the road surface and agent data.
     """
 
-    z_value = agent_data.accelerometer.z
-    prev_z = z_history[-1] if z_history else z_value
-
-    z_history.append(z_value)
-
-    z_diff = z_value - prev_z
-
-    if z_diff < -THRESHOLD_POTHOLE:
-        road_state = "pothole"
-    elif z_diff > THRESHOLD_BUMP and len(z_history) >= 2:
-        if z_history[-2] > z_history[-1]:
-            road_state = "bump"
-        else:
-            road_state = "normal"
-    else:
-        road_state = "normal"
+    states = vehicle_states.shard(agent_data.user_id)
+    with states.lock:
+        slot = states.acquire(agent_data.user_id)
+        code = classifier.classify_sample(agent_data.accelerometer.z, states.columns, slot)
 
     processed_data = ProcessedAgentData(
-        road_state=road_state,
+        road_state=ROAD_STATES[code],
         agent_data=agent_data
     )
-
     return processed_data
 
 
+def process_agent_data_batch(
+    agent_data_batch: List[AgentData],
+) -> List[ProcessedAgentData]:
+    """
+    Process a window of agent data and classify the state of the road surface vectorized.
+    Samples of different vehicles may be mixed, every vehicle is classified as its own window.
+    Parameters:
+        agent_data_batch (List[AgentData]): Agent data in arrival order.
+    Returns:
+        List[ProcessedAgentData]: Processed data in the same order.
+    """
+    vehicles: Dict[Optional[int], List[int]] = {}
+    for index, agent_data in enumerate(agent_data_batch):
+        vehicles.setdefault(agent_data.user_id, []).append(index)
+
+    road_states: List[str] = [""] * len(agent_data_batch)
+    for user_id, indices in vehicles.items():
+        z = np.fromiter(
+            (agent_data_batch[index].accelerometer.z for index in indices),
+            dtype=np.float64,
+            count=len(indices),
+        )
+        states = vehicle_states.shard(user_id)
+        with states.lock:
+            slot = states.acquire(user_id)
+            codes = classifier.classify_window(z, states.columns, slot)
+
+        for index, code in zip(indices, codes.tolist()):
+            road_states[index] = ROAD_STATES[code]
+
+    return [
+        ProcessedAgentData(road_state=road_state, agent_data=agent_data)
+        for road_state, agent_data in zip(road_states, agent_data_batch)
+    ]
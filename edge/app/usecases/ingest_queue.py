@@ -0,0 +1,103 @@
+import threading
+from collections import deque
+from typing import Deque, List, Optional
+
+from app.entities.processed_agent_data import ProcessedAgentData
+
+# Overflow policies of a full queue
+BLOCK = "block"  # the producer waits for free space
+DROP_OLDEST = "drop_oldest"  # the oldest queued record makes room
+DROP_NORMAL = "drop_normal"  # normal records are dropped first, anomalies are kept
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NORMAL)
+
+
+class IngestQueue:
+    """
+    Bounded queue of processed records between the MQTT callback and the hub workers.
+    Absorbs bursts while the hub is slow, the overflow policy decides what happens
+    when even the queue is full.
+    """
+
+    def __init__(self, maxsize: int, overflow: str = BLOCK) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._items: Deque[ProcessedAgentData] = deque()
+        # Consumers wait for records, blocked producers for free space, on one lock
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+
+        self.enqueued = 0
+        self.dropped_oldest = 0
+        self.dropped_normal = 0
+        self.dropped_anomalies = 0
+        # Blocked producers of a full queue that was closed
+        self.dropped_closed = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: ProcessedAgentData) -> bool:
+        """Queue a record, returns False if the record itself was dropped"""
+        with self._lock:
+            if len(self._items) >= self.maxsize and not self._make_room(item):
+                return False
+            self._items.append(item)
+            self.enqueued += 1
+            self._not_empty.notify()
+        return True
+
+    def get_batch(self, max_items: int, timeout: Optional[float] = None) -> List[ProcessedAgentData]:
+        """Wait for records and return up to max_items of them, empty on timeout or close"""
+        with self._lock:
+            if not self._items and not self._closed:
+                self._not_empty.wait(timeout)
+            batch = []
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft())
+            if batch:
+                self._not_full.notify(len(batch))
+            return batch
+
+    def close(self) -> None:
+        """Wake up every waiting producer and consumer, queued records can still be taken"""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def _make_room(self, item: ProcessedAgentData) -> bool:
+        if self.overflow == BLOCK:
+            while len(self._items) >= self.maxsize and not self._closed:
+                self._not_full.wait()
+            if len(self._items) < self.maxsize:
+                return True
+            self.dropped_closed += 1
+            if item.road_state != "normal":
+                self.dropped_anomalies += 1
+            return False
+
+        if self.overflow == DROP_OLDEST:
+            self._drop(self._items.popleft())
+            return True
+
+        # DROP_NORMAL
+        if item.road_state == "normal":
+            self.dropped_normal += 1
+            return False
+        for index, queued in enumerate(self._items):
+            if queued.road_state == "normal":
+                del self._items[index]
+                self.dropped_normal += 1
+                return True
+        # Only anomalies are queued, the oldest of them has to go
+        self._drop(self._items.popleft())
+        return True
+
+    def _drop(self, item: ProcessedAgentData) -> None:
+        self.dropped_oldest += 1
+        if item.road_state != "normal":
+            self.dropped_anomalies += 1
@@ -0,0 +1,108 @@
+import math
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from app.usecases.vehicle_state import ColumnSpec
+
+# Features computed for every window length, named f"{feature}_{window}"
+WINDOW_FEATURES = ("variance", "rms", "peak_to_peak", "mean_abs_jerk")
+
+
+class SignalFeatures:
+    """
+    Rolling statistics of the z signal of every vehicle, updated in O(1) per sample.
+    For every window length it keeps running sums for variance, RMS and mean absolute
+    jerk, and monotonic min/max queues for peak-to-peak. All state lives in
+    preallocated vehicle state columns, so nothing is allocated per sample and the
+    cost does not grow with the window length. The latest values are written to the
+    "features" column, the instant jerk (z difference to the previous sample) last.
+    """
+
+    def __init__(self, windows: Sequence[int]) -> None:
+        self.windows: List[int] = sorted(set(windows))
+        if not self.windows or self.windows[0] < 2:
+            raise ValueError(f"Feature windows must be at least 2 samples long, got {windows}")
+        longest = self.windows[-1]
+        # The jerk leaving a window needs the two samples before the window
+        self.ring_size = longest + 2
+        self.names: List[str] = [
+            f"{feature}_{window}" for window in self.windows for feature in WINDOW_FEATURES
+        ] + ["jerk"]
+        self.index: Dict[str, int] = {name: index for index, name in enumerate(self.names)}
+
+        count = len(self.windows)
+        self.columns: ColumnSpec = {
+            "ring": (np.float64, (self.ring_size,)),
+            "count": (np.int64, ()),
+            "sums": (np.float64, (count,)),
+            "square_sums": (np.float64, (count,)),
+            "jerk_sums": (np.float64, (count,)),
+            # Monotonic queues of sample numbers, bounded by the window length
+            "max_queue": (np.int64, (count, longest)),
+            "min_queue": (np.int64, (count, longest)),
+            "queue_ends": (np.int64, (count, 4)),  # max head, max tail, min head, min tail
+            "features": (np.float64, (len(self.names),)),
+        }
+
+    def update(self, columns: Dict[str, np.ndarray], slot: int, z: float) -> np.ndarray:
+        """Add the next z value of the vehicle and return its updated features row"""
+        ring = columns["ring"][slot]
+        n = int(columns["count"][slot])
+        size = self.ring_size
+        ring[n % size] = z
+        jerk = z - ring[(n - 1) % size] if n else 0.0
+        columns["count"][slot] = n + 1
+
+        sums = columns["sums"][slot]
+        square_sums = columns["square_sums"][slot]
+        jerk_sums = columns["jerk_sums"][slot]
+        ends = columns["queue_ends"][slot]
+        features = columns["features"][slot]
+        for k, window in enumerate(self.windows):
+            sums[k] += z
+            square_sums[k] += z * z
+            jerk_sums[k] += abs(jerk)
+            if n >= window:
+                leaving = ring[(n - window) % size]
+                sums[k] -= leaving
+                square_sums[k] -= leaving * leaving
+                # Jerk of the sample leaving the window, the first sample has none
+                if n > window:
+                    jerk_sums[k] -= abs(leaving - ring[(n - window - 1) % size])
+
+            samples = min(n + 1, window)
+            mean = sums[k] / samples
+            mean_square = square_sums[k] / samples
+            base = k * len(WINDOW_FEATURES)
+            features[base] = max(mean_square - mean * mean, 0.0)
+            features[base + 1] = math.sqrt(max(mean_square, 0.0))
+            features[base + 2] = self._push(
+                columns["max_queue"][slot][k], ends[k], 0, ring, n, window, z, True
+            ) - self._push(columns["min_queue"][slot][k], ends[k], 2, ring, n, window, z, False)
+            features[base + 3] = jerk_sums[k] / min(n, window) if n else 0.0
+        features[-1] = jerk
+        return features
+
+    def count(self, columns: Dict[str, np.ndarray], slot: int) -> int:
+        """Number of samples the vehicle's features are built from"""
+        return int(columns["count"][slot])
+
+    def _push(self, queue, ends, offset, ring, n, window, z, is_max) -> float:
+        """Add sample n to a monotonic queue and return the max (or min) of the window"""
+        capacity = queue.shape[0]
+        size = self.ring_size
+        head, tail = int(ends[offset]), int(ends[offset + 1])
+        # Samples that left the window
+        while head < tail and queue[head % capacity] <= n - window:
+            head += 1
+        # Samples that can no longer be the max (min) of any window
+        while head < tail:
+            last = ring[queue[(tail - 1) % capacity] % size]
+            if last > z if is_max else last < z:
+                break
+            tail -= 1
+        queue[tail % capacity] = n
+        tail += 1
+        ends[offset], ends[offset + 1] = head, tail
+        return float(ring[queue[head % capacity] % size])
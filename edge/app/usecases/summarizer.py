@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Hashable, List, Optional
+
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.entities.road_summary import RoadSummary, ValueStats
+
+# Accelerometer fields rolled up by a summary, the first three are reported in it
+SUMMARY_FIELDS = ("z", "air", "noise", "x", "y")
+
+
+@dataclass(slots=True)
+class _Rollup:
+    opened_at: float
+    start: datetime
+    end: datetime = None
+    count: int = 0
+    polyline: List[GpsData] = field(default_factory=list)
+    mins: List[float] = field(default_factory=lambda: [float("inf")] * len(SUMMARY_FIELDS))
+    maxs: List[float] = field(default_factory=lambda: [float("-inf")] * len(SUMMARY_FIELDS))
+    sums: List[float] = field(default_factory=lambda: [0.0] * len(SUMMARY_FIELDS))
+
+    def add(self, agent_data: AgentData) -> None:
+        accelerometer = agent_data.accelerometer
+        for index, name in enumerate(SUMMARY_FIELDS):
+            value = getattr(accelerometer, name)
+            if value < self.mins[index]:
+                self.mins[index] = value
+            if value > self.maxs[index]:
+                self.maxs[index] = value
+            self.sums[index] += value
+        self.count += 1
+        self.end = agent_data.timestamp
+        self.polyline.append(agent_data.gps)
+
+
+class Summarizer:
+    """
+    Stage after the classification that forwards anomalies right away and rolls up
+    the normal samples of every vehicle into one record per window seconds.
+    A summary record has road_state "normal", its agent_data carries the mean
+    accelerometer values and the last position of the window, its summary the
+    count, the GPS polyline and min/max/mean of z, air and noise.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.summarized = 0
+        self.summaries = 0
+        # Open windows of the vehicles, the earliest opened first
+        self._rollups: "OrderedDict[Hashable, _Rollup]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rollups)
+
+    def add(self, processed_data: ProcessedAgentData, now: float = None) -> List[ProcessedAgentData]:
+        """Take a classified record, returns the records to forward now"""
+        if processed_data.road_state != "normal":
+            return [processed_data]
+
+        now = time.monotonic() if now is None else now
+        agent_data = processed_data.agent_data
+        key = agent_data.user_id
+        with self.lock:
+            forward = []
+            rollup = self._rollups.get(key)
+            if rollup is not None and now - rollup.opened_at >= self.window:
+                forward.append(self._close(key))
+                rollup = None
+            if rollup is None:
+                rollup = _Rollup(opened_at=now, start=agent_data.timestamp)
+                self._rollups[key] = rollup
+            rollup.add(agent_data)
+            self.summarized += 1
+        return forward
+
+    def flush_expired(self, now: float = None) -> List[ProcessedAgentData]:
+        """Close the windows that are open for window seconds, for vehicles gone quiet"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            expired = []
+            for key, rollup in self._rollups.items():
+                if now - rollup.opened_at < self.window:
+                    break
+                expired.append(key)
+            return [self._close(key) for key in expired]
+
+    def flush_all(self) -> List[ProcessedAgentData]:
+        """Close every open window, used on shutdown"""
+        with self.lock:
+            return [self._close(key) for key in list(self._rollups)]
+
+    def _close(self, key: Optional[Hashable]) -> ProcessedAgentData:
+        rollup = self._rollups.pop(key)
+        self.summaries += 1
+        means = [total / rollup.count for total in rollup.sums]
+        stats = [
+            ValueStats(min=rollup.mins[index], max=rollup.maxs[index], mean=means[index])
+            for index in range(3)
+        ]
+        z_mean, air_mean, noise_mean, x_mean, y_mean = means
+        return ProcessedAgentData(
+            road_state="normal",
+            agent_data=AgentData(
+                accelerometer=AccelerometerData(
+                    x=x_mean, y=y_mean, z=z_mean, air=air_mean, noise=noise_mean
+                ),
+                gps=rollup.polyline[-1],
+                timestamp=rollup.end,
+                user_id=key,
+            ),
+            summary=RoadSummary(
+                count=rollup.count,
+                start=rollup.start,
+                end=rollup.end,
+                polyline=rollup.polyline,
+                z=stats[0],
+                air=stats[1],
+                noise=stats[2],
+            ),
+        )
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple
+
+import numpy as np
+
+# Column name -> (dtype, shape of the value of one vehicle)
+ColumnSpec = Dict[str, Tuple[type, Tuple[int, ...]]]
+
+
+class VehicleStateTable:
+    """
+    Fixed number of per-vehicle state slots held in preallocated NumPy columns.
+    A vehicle gets a slot on its first sample. Vehicles that were quiet for longer than
+    ttl seconds are evicted, and when all slots are taken the least recently seen
+    vehicle gives its slot away. The table is not thread safe, callers hold its lock.
+    """
+
+    def __init__(self, capacity: int, ttl: float, columns: ColumnSpec) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.columns = {
+            name: np.zeros((capacity, *shape), dtype=dtype)
+            for name, (dtype, shape) in columns.items()
+        }
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.evicted = 0
+        # Least recently seen vehicle first
+        self._slots: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def acquire(self, key: Hashable, now: float = None) -> int:
+        """Return the slot of the vehicle, a new vehicle gets a slot with zeroed state"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._slots.move_to_end(key)
+        else:
+            if not self._free:
+                self._evict_oldest()
+            slot = self._free.pop()
+            self._slots[key] = slot
+            for column in self.columns.values():
+                column[slot] = 0
+        self.last_seen[slot] = now
+        return slot
+
+    def _expire(self, now: float) -> None:
+        while self._slots:
+            slot = next(iter(self._slots.values()))
+            if now - self.last_seen[slot] <= self.ttl:
+                return
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        _, slot = self._slots.popitem(last=False)
+        self._free.append(slot)
+        self.evicted += 1
+
+
+class ShardedVehicleStates:
+    """
+    Vehicle state split into independently locked shards by vehicle id,
+    so samples of different vehicles can be processed in parallel.
+    """
+
+    def __init__(self, shards: int, capacity: int, ttl: float, columns: ColumnSpec) -> None:
+        per_shard = max(1, -(-capacity // shards))
+        self.shards = [VehicleStateTable(per_shard, ttl, columns) for _ in range(shards)]
+
+    def shard(self, key: Hashable) -> VehicleStateTable:
+        return self.shards[hash(key) % len(self.shards)]
+
+    def stats(self) -> dict:
+        return {
+            "vehicles": sum(len(shard) for shard in self.shards),
+            "capacity": sum(shard.capacity for shard in self.shards),
+            "evicted": sum(shard.evicted for shard in self.shards),
+        }
@@ -8,6 +8,13 @@ def try_parse_int(value: str):
         return None
 
 
+def try_parse_float(value: str):
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
 # Configuration for agent MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
@@ -22,3 +29,71 @@ HUB_MQTT_TOPIC = os.environ.get("HUB_MQTT_TOPIC") or "processed_agent_data_topic
 HUB_HOST = os.environ.get("HUB_HOST") or "localhost"
 HUB_PORT = try_parse_int(os.environ.get("HUB_PORT")) or 8000
 HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
+
+# Per-vehicle classifier state
+# Maximum number of vehicles whose state is kept, the least recently seen are evicted
+VEHICLE_STATE_CAPACITY = try_parse_int(os.environ.get("VEHICLE_STATE_CAPACITY")) or 10000
+# Seconds after the last sample of a vehicle before its state is evicted
+VEHICLE_STATE_TTL = try_parse_int(os.environ.get("VEHICLE_STATE_TTL")) or 600
+# Number of independently locked shards of the state
+VEHICLE_STATE_SHARDS = try_parse_int(os.environ.get("VEHICLE_STATE_SHARDS")) or 16
+
+# Road state classifier: "zdiff" (difference of consecutive z values) or "features"
+# (jerk confirmed by rolling signal features)
+CLASSIFIER = os.environ.get("CLASSIFIER") or "zdiff"
+# Window lengths in samples of the rolling features, comma separated
+FEATURE_WINDOWS = [
+    try_parse_int(window) for window in (os.environ.get("FEATURE_WINDOWS") or "").split(",")
+]
+if not all(FEATURE_WINDOWS):
+    FEATURE_WINDOWS = [16, 64]
+# How many times the short window peak-to-peak must exceed the long window standard deviation
+FEATURE_SPIKE_RATIO = try_parse_float(os.environ.get("FEATURE_SPIKE_RATIO")) or 4
+
+# Seconds of normal samples of a vehicle rolled up into one summary record,
+# 0 forwards every sample. Potholes and bumps are always forwarded at once.
+SUMMARY_WINDOW = try_parse_int(os.environ.get("SUMMARY_WINDOW")) or 0
+
+# Queue between the agent MQTT callback and the hub workers
+INGEST_QUEUE_SIZE = try_parse_int(os.environ.get("INGEST_QUEUE_SIZE")) or 10000
+# What happens when the queue is full: "block", "drop_oldest" or "drop_normal"
+INGEST_OVERFLOW = os.environ.get("INGEST_OVERFLOW") or "block"
+# Number of worker threads sending records to the hub
+INGEST_WORKERS = try_parse_int(os.environ.get("INGEST_WORKERS")) or 2
+# Where the hub gateway runs: "thread" (in the edge process) or "process" (a pool of
+# INGEST_PROCESSES processes with a gateway each)
+INGEST_POOL = os.environ.get("INGEST_POOL") or "thread"
+INGEST_PROCESSES = try_parse_int(os.environ.get("INGEST_PROCESSES")) or 2
+# Maximum number of records a worker hands to the hub gateway at once
+INGEST_BATCH_SIZE = try_parse_int(os.environ.get("INGEST_BATCH_SIZE")) or 10
+
+# Seconds the edge waits for queued records to be delivered on shutdown
+SHUTDOWN_TIMEOUT = try_parse_int(os.environ.get("SHUTDOWN_TIMEOUT")) or 30
+
+# Hub gateway used by the edge: "mqtt" or "http"
+HUB_GATEWAY = os.environ.get("HUB_GATEWAY") or "mqtt"
+
+# HTTP hub gateway
+# Records posted to the Hub in one request
+HUB_HTTP_BATCH_SIZE = try_parse_int(os.environ.get("HUB_HTTP_BATCH_SIZE")) or 100
+# Maximum time in milliseconds a record waits for its batch to fill up
+HUB_HTTP_LINGER_MS = try_parse_int(os.environ.get("HUB_HTTP_LINGER_MS")) or 500
+# Gzip the request bodies
+HUB_HTTP_GZIP = (os.environ.get("HUB_HTTP_GZIP") or "false").lower() in ("1", "true", "yes")
+# Request timeout in seconds and the number of retries of a failed batch
+HUB_HTTP_TIMEOUT = try_parse_int(os.environ.get("HUB_HTTP_TIMEOUT")) or 5
+HUB_HTTP_MAX_RETRIES = try_parse_int(os.environ.get("HUB_HTTP_MAX_RETRIES")) or 5
+
+# MQTT hub gateway
+# Records packed into one message, 1 publishes every record as its own message
+HUB_MQTT_BATCH_SIZE = try_parse_int(os.environ.get("HUB_MQTT_BATCH_SIZE")) or 1
+# Maximum time in milliseconds a record waits for its batch to fill up
+HUB_MQTT_LINGER_MS = try_parse_int(os.environ.get("HUB_MQTT_LINGER_MS")) or 100
+HUB_MQTT_QOS = try_parse_int(os.environ.get("HUB_MQTT_QOS")) or 0
+# Maximum number of messages not yet confirmed by the client before publishing waits
+HUB_MQTT_MAX_IN_FLIGHT = try_parse_int(os.environ.get("HUB_MQTT_MAX_IN_FLIGHT")) or 100
+
+# Prometheus metrics endpoint (GET /metrics), port 0 disables it
+METRICS_HOST = os.environ.get("METRICS_HOST") or "0.0.0.0"
+METRICS_PORT = try_parse_int(os.environ.get("METRICS_PORT"))
+METRICS_PORT = 9101 if METRICS_PORT is None else METRICS_PORT
@@ -1,17 +1,65 @@
+import asyncio
 import logging
 from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
 from app.adapters.hub_http_adapter import HubHttpAdapter
 from app.adapters.hub_mqtt_adapter import HubMqttAdapter
+from app.adapters.process_pool_hub_gateway import ProcessPoolHubGateway
+from app.metrics import MetricsServer
+from app.runtime import EdgeRuntime
+from app.usecases.summarizer import Summarizer
 from config import (
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
     MQTT_TOPIC,
     HUB_URL,
+    HUB_GATEWAY,
+    HUB_HTTP_BATCH_SIZE,
+    HUB_HTTP_LINGER_MS,
+    HUB_HTTP_GZIP,
+    HUB_HTTP_TIMEOUT,
+    HUB_HTTP_MAX_RETRIES,
     HUB_MQTT_BROKER_HOST,
     HUB_MQTT_BROKER_PORT,
     HUB_MQTT_TOPIC,
+    HUB_MQTT_BATCH_SIZE,
+    HUB_MQTT_LINGER_MS,
+    HUB_MQTT_QOS,
+    HUB_MQTT_MAX_IN_FLIGHT,
+    INGEST_QUEUE_SIZE,
+    INGEST_OVERFLOW,
+    INGEST_WORKERS,
+    INGEST_POOL,
+    INGEST_PROCESSES,
+    INGEST_BATCH_SIZE,
+    SHUTDOWN_TIMEOUT,
+    SUMMARY_WINDOW,
+    METRICS_HOST,
+    METRICS_PORT,
 )
 
+
+def make_hub_gateway():
+    """Create an instance of the hub gateway using the configuration"""
+    if HUB_GATEWAY == "http":
+        return HubHttpAdapter(
+            api_base_url=HUB_URL,
+            batch_size=HUB_HTTP_BATCH_SIZE,
+            linger=HUB_HTTP_LINGER_MS / 1000,
+            compress=HUB_HTTP_GZIP,
+            timeout=HUB_HTTP_TIMEOUT,
+            max_retries=HUB_HTTP_MAX_RETRIES,
+        )
+    return HubMqttAdapter(
+        broker=HUB_MQTT_BROKER_HOST,
+        port=HUB_MQTT_BROKER_PORT,
+        topic=HUB_MQTT_TOPIC,
+        batch_size=HUB_MQTT_BATCH_SIZE,
+        linger=HUB_MQTT_LINGER_MS / 1000,
+        qos=HUB_MQTT_QOS,
+        max_in_flight=HUB_MQTT_MAX_IN_FLIGHT,
+    )
+
+
 if __name__ == "__main__":
     # Configure logging settings
     logging.basicConfig(
@@ -22,30 +70,34 @@ if __name__ == "__main__":
             logging.FileHandler("app.log"),  # Save log messages to a file
         ],
     )
-    # Create an instance of the StoreApiAdapter using the configuration
-    # hub_adapter = HubHttpAdapter(
-    #     api_base_url=HUB_URL,
-    # )
-    hub_adapter = HubMqttAdapter(
-        broker=HUB_MQTT_BROKER_HOST,
-        port=HUB_MQTT_BROKER_PORT,
-        topic=HUB_MQTT_TOPIC,
-    )
+    if INGEST_POOL == "process":
+        hub_adapter = ProcessPoolHubGateway(
+            make_hub_gateway, processes=INGEST_PROCESSES, close_timeout=SHUTDOWN_TIMEOUT
+        )
+    else:
+        hub_adapter = make_hub_gateway()
     # Create an instance of the AgentMQTTAdapter using the configuration
     agent_adapter = AgentMQTTAdapter(
         broker_host=MQTT_BROKER_HOST,
         broker_port=MQTT_BROKER_PORT,
         topic=MQTT_TOPIC,
         hub_gateway=hub_adapter,
+        batch_size=INGEST_BATCH_SIZE,
+        queue_size=INGEST_QUEUE_SIZE,
+        overflow=INGEST_OVERFLOW,
+        # Hub workers run as tasks of the runtime
+        workers=0,
+        summarizer=Summarizer(window=SUMMARY_WINDOW) if SUMMARY_WINDOW > 0 else None,
+    )
+    if METRICS_PORT:
+        agent_adapter.register_metrics()
+        hub_adapter.register_metrics()
+        MetricsServer(METRICS_HOST, METRICS_PORT).start()
+    runtime = EdgeRuntime(
+        agent_adapter=agent_adapter,
+        hub_gateway=hub_adapter,
+        workers=INGEST_WORKERS,
+        shutdown_timeout=SHUTDOWN_TIMEOUT,
     )
-    try:
-        # Connect to the MQTT broker and start listening for messages
-        agent_adapter.connect()
-        agent_adapter.start()
-        # Keep the system running indefinitely (you can add other logic as needed)
-        while True:
-            pass
-    except KeyboardInterrupt:
-        # Stop the MQTT adapter and exit gracefully if interrupted by the user
-        agent_adapter.stop()
-        logging.info("System stopped.")
+    # Run until SIGINT/SIGTERM, then drain the queued records and stop
+    asyncio.run(runtime.run())
@@ -0,0 +1,101 @@
+import logging
+from typing import List
+
+import httpx
+
+from app.adapters.store_columns import (
+    COLUMNS_CONTENT_TYPE,
+    check_compression,
+    compress,
+    content_encoding,
+    encode_columns,
+)
+from app.interfaces.async_store_gateway import AsyncStoreGateway, PermanentStoreError
+
+# Client errors that depend on the moment rather than on the records
+RETRIABLE_CLIENT_ERRORS = (408, 425, 429)
+
+
+class AsyncStoreApiAdapter(AsyncStoreGateway):
+    """
+    Sends processed data to the Store API from the event loop.
+    One pooled HTTP client keeps at most max_connections connections to the store open,
+    every request is bounded by timeout seconds.
+    Batches are sent as a JSON array of the queued records, compressed, or with
+    body_format "columns" packed in columns and compressed. A store that refuses columns
+    without listing the format in Accept-Post predates it, it gets uncompressed JSON from
+    then on. A client error other than a timeout or rate limit refuses the
+    records themselves, it is raised as PermanentStoreError instead of being retried.
+    """
+
+    def __init__(
+        self, api_base_url, max_connections=10, timeout=10, body_format="json", compression="gzip"
+    ):
+        self.api_base_url = api_base_url
+        self.body_format = body_format
+        self.compression = check_compression(compression)
+        self.client = httpx.AsyncClient(
+            base_url=api_base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(timeout),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def save_raw_batch(self, raw_records: List[bytes]) -> bool:
+        """
+        Save the processed road data to the Store API.
+        Parameters:
+            raw_records (List[bytes]): Records serialized as canonical JSON by the hub intake.
+        Returns:
+            bool: True if the data is successfully saved, False on a timeout or a server error.
+        Raises:
+            PermanentStoreError: If the store refused the records with a client error.
+        """
+        if self.body_format == "columns":
+            try:
+                body = encode_columns(raw_records)
+            except (ValueError, KeyError, TypeError) as e:
+                logging.error(f"Error packing {len(raw_records)} records in columns, sending JSON: {e!r}")
+            else:
+                response = await self._post(body, COLUMNS_CONTENT_TYPE)
+                if response is None or response.status_code == 200 or _knows_columns(response):
+                    return self._saved(response, raw_records)
+                logging.warning(f"Store does not accept {COLUMNS_CONTENT_TYPE}, sending JSON")
+                # Content-Encoding came with the same store version
+                self.body_format, self.compression = "json", "none"
+        data = b"[" + b",".join(raw_records) + b"]"
+        return self._saved(await self._post(data, "application/json"), raw_records)
+
+    async def _post(self, body: bytes, content_type: str):
+        headers = {"Content-Type": content_type}
+        encoding = content_encoding(self.compression)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        try:
+            return await self.client.post(
+                "/processed_agent_data/", content=compress(body, self.compression), headers=headers
+            )
+        except httpx.HTTPError as e:
+            logging.error(f"Error occurred during request: {e!r}")
+            return None
+
+    def _saved(self, response, raw_records: List[bytes]) -> bool:
+        if response is None:
+            return False
+        if 400 <= response.status_code < 500 and response.status_code not in RETRIABLE_CLIENT_ERRORS:
+            raise PermanentStoreError(
+                f"Store refused {len(raw_records)} records: {response.status_code} {response.text[:500]}"
+            )
+        if response.status_code != 200:
+            logging.error(f"Invalid Store response\nRecords: {len(raw_records)}\nResponse: {response}")
+            return False
+        return True
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _knows_columns(response: httpx.Response) -> bool:
+    return COLUMNS_CONTENT_TYPE in response.headers.get("accept-post", "")
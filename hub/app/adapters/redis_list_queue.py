@@ -0,0 +1,33 @@
+from typing import List, Tuple
+
+from redis.asyncio import Redis
+
+from app.interfaces.record_queue import RecordQueue
+
+
+class RedisListQueue(RecordQueue):
+    """
+    Records in a Redis list, claimed with one atomic LPOP key count.
+    A claimed record exists only in the memory of the claiming hub, if that hub dies
+    before the store write the record is lost. Use RedisStreamQueue when that matters.
+    """
+
+    def __init__(self, redis_client: Redis, key: str = "processed_agent_data"):
+        self.redis_client = redis_client
+        self.key = key
+
+    async def push(self, raw_records: List[str]) -> int:
+        return await self.redis_client.rpush(self.key, *raw_records)
+
+    async def claim(self, count: int) -> List[Tuple[bytes, bytes]]:
+        raw_records = await self.redis_client.lpop(self.key, count) or []
+        # A list has no record ids, the record stands for itself
+        return [(raw, raw) for raw in raw_records]
+
+    async def ack(self, ids: List[bytes]):
+        # Popped records are already gone
+        pass
+
+    async def release(self, claimed: List[Tuple[bytes, bytes]]):
+        # Back to the head of the list, in the original order
+        await self.redis_client.lpush(self.key, *(raw for _, raw in reversed(claimed)))
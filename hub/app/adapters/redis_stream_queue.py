@@ -0,0 +1,128 @@
+import logging
+from typing import List, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.interfaces.record_queue import RecordQueue
+
+
+class RedisStreamQueue(RecordQueue):
+    """
+    Records in a Redis stream read through a consumer group, so any number of hub
+    replicas can share the queue. Every record is delivered to one consumer in stream
+    order and stays pending until it is acknowledged after the store write. A consumer
+    retries its own released records first, records pending for longer than
+    claim_timeout seconds at another consumer, which most likely died, are reclaimed
+    by the next consumer that claims a batch.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        consumer: str,
+        key: str = "processed_agent_data_stream",
+        group: str = "hub",
+        claim_timeout: float = 30,
+    ):
+        self.redis_client = redis_client
+        self.consumer = consumer
+        self.key = key
+        self.group = group
+        self.claim_timeout = claim_timeout
+
+    async def open(self):
+        """Create the consumer group and the stream, drop consumers that are gone"""
+        try:
+            await self.redis_client.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            # Created by another hub replica
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self._remove_idle_consumers()
+
+    async def _remove_idle_consumers(self):
+        # Replicas that were replaced leave their consumers behind. One idle for longer
+        # than claim_timeout without pending records holds nothing, a live replica that
+        # was merely idle is added back by its next read.
+        removed = 0
+        for consumer in await self.redis_client.xinfo_consumers(self.key, self.group):
+            name = consumer["name"]
+            if isinstance(name, bytes):
+                name = name.decode("utf-8")
+            if (
+                name != self.consumer
+                and consumer["pending"] == 0
+                and consumer["idle"] >= self.claim_timeout * 1000
+            ):
+                await self.redis_client.xgroup_delconsumer(self.key, self.group, name)
+                removed += 1
+        if removed:
+            logging.info(f"Removed {removed} idle consumers from {self.key}")
+
+    async def push(self, raw_records: List[str]) -> int:
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for raw in raw_records:
+            pipeline.xadd(self.key, {"data": raw})
+        # Acknowledged records are deleted, so the stream holds the pending ones and
+        # those not delivered yet, only the latter are waiting for a flush
+        pipeline.xlen(self.key)
+        pipeline.xpending(self.key, self.group)
+        *_, length, pending = await pipeline.execute()
+        return max(0, length - pending["pending"])
+
+    async def claim(self, count: int) -> List[Tuple[bytes, bytes]]:
+        # Own pending records first (released ones, or left by a restart under the same
+        # name), then stale records of other consumers, both older than anything new
+        entries = []
+        for _, own_entries in await self.redis_client.xreadgroup(
+            self.group, self.consumer, {self.key: "0"}, count=count
+        ):
+            entries.extend(own_entries)
+        if len(entries) < count:
+            # Idle own records are claimed again too, they are already in the batch
+            own_ids = {entry_id for entry_id, _ in entries}
+            reclaimed = await self._reclaim(count - len(entries))
+            entries.extend(entry for entry in reclaimed if entry[0] not in own_ids)
+            entries.sort(key=lambda entry: tuple(map(int, entry[0].split(b"-"))))
+        if len(entries) < count:
+            response = await self.redis_client.xreadgroup(
+                self.group, self.consumer, {self.key: ">"}, count=count - len(entries)
+            )
+            for _, new_entries in response:
+                entries.extend(new_entries)
+        # Entries whose data was deleted while pending come back without fields, they
+        # would stay pending and be read again by every claim, so they are let go
+        deleted = [entry_id for entry_id, fields in entries if not fields]
+        if deleted:
+            logging.warning(f"Dropped {len(deleted)} deleted records pending in {self.key}")
+            await self.ack(deleted)
+        return [(entry_id, fields[b"data"]) for entry_id, fields in entries if fields]
+
+    async def _reclaim(self, count: int) -> list:
+        # Redis 7 adds the ids of deleted entries as a third item of the reply
+        reply = await self.redis_client.xautoclaim(
+            self.key,
+            self.group,
+            self.consumer,
+            min_idle_time=int(self.claim_timeout * 1000),
+            start_id="0-0",
+            count=count,
+        )
+        entries = reply[1]
+        if entries:
+            logging.info(f"Reclaimed {len(entries)} stale records from {self.key}")
+        return entries
+
+    async def ack(self, ids: List[bytes]):
+        if not ids:
+            return
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.xack(self.key, self.group, *ids)
+        # Acknowledged records are not needed by anyone, the stream stays small
+        pipeline.xdel(self.key, *ids)
+        await pipeline.execute()
+
+    async def release(self, claimed: List[Tuple[bytes, bytes]]):
+        # The records stay pending, the next claim of this consumer returns them first
+        pass
@@ -0,0 +1,109 @@
+import gzip
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import pydantic_core
+from pydantic import TypeAdapter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Packed columnar body of a store batch, decoded by the store without JSON or pydantic.
+# Little endian: magic, record count, the road state dictionary (count, then length
+# prefixed UTF-8 names) and one code per record, the float64 columns in FLOAT_COLUMNS
+# order, int64 timestamps in microseconds since the epoch and the int16 UTC offsets of
+# the timestamps in minutes, NAIVE_OFFSET for a timestamp without a timezone.
+# A batch with road summaries starts with SUMMARY_MAGIC and ends with the uint32 lengths
+# of the summaries as JSON, 0 for a record without one, followed by those JSON texts.
+COLUMNS_CONTENT_TYPE = "application/x-road-columns"
+MAGIC = b"RDC1"
+SUMMARY_MAGIC = b"RDC2"
+HEADER = struct.Struct("<4sI")
+FLOAT_COLUMNS = ("x", "y", "z", "air", "noise", "latitude", "longitude")
+NAIVE_OFFSET = -32768
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# Parses the timestamps as pydantic wrote them, fromisoformat before Python 3.11 does not
+# take their "Z" suffix
+_DATETIME = TypeAdapter(datetime)
+
+
+def encode_columns(raw_records: List[bytes]) -> bytes:
+    """
+    Pack records queued as canonical JSON into the columnar store body.
+    Raises ValueError for more than 256 road states in one batch.
+    """
+    # One parse of the whole batch is several times faster than one per record
+    records = pydantic_core.from_json(b"[" + b",".join(raw_records) + b"]")
+    states = {}
+    codes = bytes(states.setdefault(record["road_state"], len(states)) for record in records)
+    agent_data = [record["agent_data"] for record in records]
+    accelerometers = [item["accelerometer"] for item in agent_data]
+    gps = [item["gps"] for item in agent_data]
+    floats = [
+        array("d", [item[name] for item in (gps if name in ("latitude", "longitude") else accelerometers)])
+        for name in FLOAT_COLUMNS
+    ]
+    timestamps = array("q")
+    offsets = array("h")
+    for item in agent_data:
+        timestamp = _DATETIME.validate_strings(item["timestamp"])
+        offset = timestamp.utcoffset()
+        if offset is None:
+            timestamps.append((timestamp - _EPOCH) // _MICROSECOND)
+            offsets.append(NAIVE_OFFSET)
+        else:
+            timestamps.append((timestamp - _EPOCH_UTC) // _MICROSECOND)
+            offsets.append(int(offset.total_seconds()) // 60)
+    summaries = [
+        b"" if record.get("summary") is None else pydantic_core.to_json(record["summary"])
+        for record in records
+    ]
+    has_summaries = any(summaries)
+
+    parts = [HEADER.pack(SUMMARY_MAGIC if has_summaries else MAGIC, len(raw_records)), bytes([len(states)])]
+    for state in states:
+        name = state.encode("utf-8")
+        parts.append(bytes([len(name)]) + name)
+    parts.append(codes)
+    columns = [*floats, timestamps, offsets]
+    if has_summaries:
+        columns.append(array("I", [len(summary) for summary in summaries]))
+    for column in columns:
+        if sys.byteorder == "big":
+            column.byteswap()
+        parts.append(column.tobytes())
+    if has_summaries:
+        parts.extend(summaries)
+    return b"".join(parts)
+
+
+def compress(body: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        # The fastest level, most of the gain is in the repeated record layout
+        return gzip.compress(body, compresslevel=1, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=1).compress(body)
+    return body
+
+
+def content_encoding(compression: str) -> Optional[str]:
+    return None if compression == "none" else compression
+
+
+def check_compression(compression: str) -> str:
+    """The compression to use, zstd falls back to gzip without the zstandard package"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown store compression {compression}, expected one of {COMPRESSIONS}")
+    if compression == "zstd" and zstandard is None:
+        return "gzip"
+    return compression
+
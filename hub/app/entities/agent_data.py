@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, field_validator
 
 
@@ -19,6 +21,8 @@ class AgentData(BaseModel):
     accelerometer: AccelerometerData
     gps: GpsData
     timestamp: datetime
+    # Vehicle of the record, picks its store shard
+    user_id: Optional[int] = None
 
     @classmethod
     @field_validator('timestamp', mode='before')
@@ -1,7 +1,11 @@
+from typing import Optional
 from pydantic import BaseModel
 from app.entities.agent_data import AgentData
+from app.entities.road_summary import RoadSummary
 
 
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    # Set on a record standing for a window of normal samples
+    summary: Optional[RoadSummary] = None
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import List
+from pydantic import BaseModel
+from app.entities.agent_data import GpsData
+
+
+class ValueStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+
+
+class RoadSummary(BaseModel):
+    """Roll-up of the consecutive normal samples of one vehicle, made by the edge"""
+
+    count: int
+    start: datetime
+    end: datetime
+    polyline: List[GpsData]
+    z: ValueStats
+    air: ValueStats
+    noise: ValueStats
@@ -0,0 +1,45 @@
+from abc import ABC, abstractmethod
+from typing import List
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+class PermanentStoreError(Exception):
+    """The store refused the records themselves, sending them again cannot succeed"""
+
+
+class AsyncStoreGateway(ABC):
+    """
+    Abstract class representing the Store Gateway interface for the event loop.
+    The methods are coroutines, a store write in flight does not block other requests.
+    """
+
+    @abstractmethod
+    async def save_raw_batch(self, raw_records: List[bytes]) -> bool:
+        """
+        Method to save records that are already validated and serialized as JSON.
+        Parameters:
+            raw_records (List[bytes]): Serialized processed agent data records.
+        Returns:
+            bool: True if the data is successfully saved, False if it may be retried.
+        Raises:
+            PermanentStoreError: If the store refused the records for good.
+        """
+        pass
+
+    async def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]) -> bool:
+        """
+        Method to save the processed agent data in the database.
+        Parameters:
+            processed_agent_data_batch (List[ProcessedAgentData]): The processed agent data to be saved.
+        Returns:
+            bool: True if the data is successfully saved, False otherwise.
+        """
+        return await self.save_raw_batch(
+            [item.model_dump_json().encode("utf-8") for item in processed_agent_data_batch]
+        )
+
+    async def close(self):
+        """
+        Method to release the connections of the gateway.
+        """
+        pass
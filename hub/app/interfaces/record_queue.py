@@ -0,0 +1,51 @@
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+
+class RecordQueue(ABC):
+    """
+    Abstract class representing the queue between the hub intake and the store writer.
+    The methods are coroutines, so the event loop keeps serving requests during Redis calls.
+    Records are serialized JSON. A claimed record belongs to the claiming consumer until
+    it is acknowledged after a successful store write or released for another attempt.
+    """
+
+    async def open(self):
+        """
+        Method to prepare the queue before the first use.
+        """
+        pass
+
+    @abstractmethod
+    async def push(self, raw_records: List[str]) -> int:
+        """
+        Method to append records to the queue.
+        Parameters:
+            raw_records (List[str]): Serialized records in arrival order.
+        Returns:
+            int: Number of records waiting to be claimed after the push.
+        """
+        pass
+
+    @abstractmethod
+    async def claim(self, count: int) -> List[Tuple[bytes, bytes]]:
+        """
+        Method to take up to count of the oldest records for writing to the store.
+        Returns:
+            List[Tuple[bytes, bytes]]: (record id, serialized record) pairs, empty if there are none.
+        """
+        pass
+
+    @abstractmethod
+    async def ack(self, ids: List[bytes]):
+        """
+        Method to remove claimed records that are written to the store.
+        """
+        pass
+
+    @abstractmethod
+    async def release(self, claimed: List[Tuple[bytes, bytes]]):
+        """
+        Method to give back claimed records the store did not accept, so they are claimed again.
+        """
+        pass
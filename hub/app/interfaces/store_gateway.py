@@ -19,3 +19,16 @@ class StoreGateway(ABC):
             bool: True if the data is successfully saved, False otherwise.
         """
         pass
+
+    def save_raw_batch(self, raw_records: List[bytes]) -> bool:
+        """
+        Method to save records that are already validated and serialized as JSON.
+        Adapters that can send the bytes as they are override it.
+        Parameters:
+            raw_records (List[bytes]): Serialized processed agent data records.
+        Returns:
+            bool: True if the data is successfully saved, False otherwise.
+        """
+        return self.save_data(
+            [ProcessedAgentData.model_validate_json(raw) for raw in raw_records]
+        )
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.async_store_gateway import AsyncStoreGateway, PermanentStoreError
+from app.interfaces.record_queue import RecordQueue
+from app.usecases.circuit_breaker import CircuitBreaker
+from app.usecases.retry_queue import RetryQueue
+
+
+class BatchFlusher:
+    """
+    Collects processed records in a record queue and writes them to the store in batches.
+    Records are validated once at the intake and queued as canonical JSON, a store batch
+    is the queued bytes joined together without parsing them again.
+    A background task flushes as soon as batch_size records are queued, and at least
+    every linger seconds whatever is queued, so partial batches do not wait for more
+    traffic. Claimed records are acknowledged after the store write. With a retry queue
+    a batch the store refuses moves there and is acknowledged, it is replayed before
+    anything new once the store is back, and the circuit breaker spaces the attempts
+    out while the store is down. Without one it is released back to the record queue.
+    A batch the store refuses for good is dropped with an error log, retrying it would
+    only hold up the batches behind it.
+    The batch size follows the store latency: it grows while
+    a full batch is written within half of target_latency and halves when a write takes
+    longer than target_latency or fails.
+    Everything runs on the event loop, a store write in flight does not hold up push.
+    With wake_size 1 every push wakes the flusher, records do not wait for a batch to
+    fill up, only for the store write in flight.
+    """
+
+    def __init__(
+        self,
+        record_queue: RecordQueue,
+        store_gateway: AsyncStoreGateway,
+        batch_size: int = 20,
+        linger: float = 1.0,
+        min_batch_size: int = 1,
+        max_batch_size: int = 1000,
+        target_latency: float = 0.5,
+        retry_queue: Optional[RetryQueue] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        wake_size: Optional[int] = None,
+    ) -> None:
+        self.record_queue = record_queue
+        self.store_gateway = store_gateway
+        self.batch_size = batch_size
+        self.linger = linger
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.retry_queue = retry_queue
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # Queued records that wake the flusher, the current batch size by default
+        self.wake_size = wake_size
+
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def push(self, processed_agent_data_batch: List[ProcessedAgentData]):
+        """Queue records for the store, a full batch wakes up the flusher"""
+        await self.push_raw([item.model_dump_json() for item in processed_agent_data_batch])
+
+    async def push_raw(self, raw_records: List[str]):
+        """Queue records that are validated and serialized as canonical JSON already"""
+        if not raw_records:
+            return
+        length = await self.record_queue.push(raw_records)
+        if length >= (self.wake_size or self.batch_size):
+            self._wake.set()
+
+    async def start(self):
+        await self.record_queue.open()
+        self._task = asyncio.create_task(self._flush_loop(), name="batch-flusher")
+
+    async def stop(self):
+        """Flush what is queued and stop the background task"""
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+        if self.retry_queue is not None:
+            await asyncio.to_thread(self.retry_queue.close)
+
+    async def flush(self) -> int:
+        """Send the queued records in batches, returns the number of records saved"""
+        flushed = self.flushed
+        while self.circuit_breaker.allow():
+            # Refused batches first, they are older than anything in the record queue
+            if self.retry_queue is not None and len(self.retry_queue):
+                raw_batch = await asyncio.to_thread(self.retry_queue.peek)
+                if not await self._send(raw_batch, len(raw_batch)):
+                    break
+                await asyncio.to_thread(self.retry_queue.pop)
+                continue
+
+            batch_size = self.batch_size
+            claimed = await self.record_queue.claim(batch_size)
+            if not claimed:
+                # Nothing to probe the store with, another flusher sharing the breaker may
+                self.circuit_breaker.release()
+                break
+            raw_batch = [raw for _, raw in claimed]
+            if not await self._send(raw_batch, batch_size):
+                if self.retry_queue is None:
+                    await self.record_queue.release(claimed)
+                    break
+                # The record queue keeps flowing, the batch waits in the retry queue
+                await asyncio.to_thread(self.retry_queue.append, raw_batch)
+            await self.record_queue.ack([record_id for record_id, _ in claimed])
+            if len(claimed) < batch_size:
+                break
+        return self.flushed - flushed
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                # An open circuit is not probed before its backoff passed
+                timeout = max(self.linger, self.circuit_breaker.retry_in())
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing processed data to the store: {e}")
+            if self._stopping:
+                return
+
+    async def _send(self, batch: List[bytes], batch_size: int) -> bool:
+        """True once the batch is done with: saved, or refused for good and dropped"""
+        started = time.perf_counter()
+        try:
+            saved = await self.store_gateway.save_raw_batch(batch)
+        except PermanentStoreError as e:
+            # The store answered, it is not down, but these records never go in
+            self.dropped += len(batch)
+            self.circuit_breaker.record_success()
+            logging.error(f"Dropped a batch of {len(batch)} records: {e}")
+            return True
+        elapsed = time.perf_counter() - started
+        if not saved:
+            self.failed += len(batch)
+            self.batch_size = max(self.min_batch_size, batch_size // 2)
+            self.circuit_breaker.record_failure()
+            return False
+        self.flushed += len(batch)
+        self.circuit_breaker.record_success()
+        if elapsed > self.target_latency:
+            self.batch_size = max(self.min_batch_size, batch_size // 2)
+        elif elapsed < self.target_latency / 2 and len(batch) == batch_size:
+            self.batch_size = min(self.max_batch_size, batch_size + max(1, batch_size // 4))
+        return True
@@ -0,0 +1,74 @@
+import random
+import time
+
+CLOSED = "closed"  # calls go through
+OPEN = "open"  # calls wait for the backoff to pass
+HALF_OPEN = "half_open"  # one probe call decides
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency and probes it with exponential backoff.
+    Every failure delays the next call by backoff_base * 2**(failures - 1) seconds,
+    capped at backoff_max and jittered. After failure_threshold consecutive failures
+    the circuit opens: the caller skips work until the backoff passed, then a single
+    probe call closes it again on success. Callers sharing the breaker are refused while
+    the probe is in flight, a probe without an outcome within probe_timeout seconds, or
+    given up with release, lets the next caller probe.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60,
+        probe_timeout: float = 60,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.probe_timeout = probe_timeout
+        self.failures = 0
+        self.opened = 0
+        self._retry_at = 0.0
+        self._probe_until = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() >= self._retry_at else OPEN
+
+    def allow(self) -> bool:
+        """True if a call may be made now, when half open only for the caller that probes"""
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        if self.failures < self.failure_threshold:
+            return True
+        if now < self._probe_until:
+            return False
+        self._probe_until = now + self.probe_timeout
+        return True
+
+    def release(self) -> None:
+        """Give up a call allowed without making it, another caller may probe"""
+        self._probe_until = 0.0
+
+    def retry_in(self) -> float:
+        """Seconds until the next call is allowed"""
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._retry_at = 0.0
+        self._probe_until = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_until = 0.0
+        if self.failures == self.failure_threshold:
+            self.opened += 1
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        # Jitter keeps hub replicas from probing the store in lockstep
+        self._retry_at = time.monotonic() + random.uniform(backoff / 2, backoff)
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import math
+import time
+from typing import List, Set
+
+
+class BloomFilter:
+    """Set membership in size bits with hashes bit positions per key, no false negatives"""
+
+    def __init__(self, size: int, hashes: int) -> None:
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+        self.bits_set = 0
+        self.inserted = 0
+
+    def contains(self, positions: List[int]) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def add(self, positions: List[int]) -> None:
+        bits = self.bits
+        for position in positions:
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                self.bits_set += 1
+        self.inserted += 1
+
+    @property
+    def false_positive_rate(self) -> float:
+        # Probability that all the positions of a new key are set already
+        return (self.bits_set / self.size) ** self.hashes
+
+
+class Deduplicator:
+    """
+    Drops records seen within the last window seconds, in bounded memory.
+    A record is identified by the hash of its canonical JSON, which holds its user_id,
+    timestamp and payload, so a redelivered or retried record matches and a new
+    sample never does. Two Bloom filters, each sized for capacity records at
+    error_rate, rotate every window seconds, or sooner once the current one is full:
+    the older one is dropped and a new one started, so a record is remembered for
+    at least window seconds unless more than capacity records arrive in that time.
+    A false positive drops a new record, false_positive_rate estimates how likely
+    that is from the bits set. A record new to the filters is claimed, checked and
+    marked in one step, so the same record pushed twice at once passes only once. It is
+    remembered in the filters once it is queued, or released if that failed.
+    """
+
+    def __init__(self, window: float, capacity: int, error_rate: float = 0.0001) -> None:
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Optimal Bloom filter parameters for capacity keys at error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.current = BloomFilter(self.size, self.hashes)
+        self.previous = BloomFilter(self.size, self.hashes)
+        # Claimed records not yet remembered or released
+        self._claimed: Set[str] = set()
+        self.duplicates = 0
+        self.rotations = 0
+        self._rotate_at = time.monotonic() + window
+
+    def seen(self, raw_record: bytes) -> bool:
+        """True if the record was remembered within the window, see add"""
+        positions = self._positions(raw_record)
+        if self.current.contains(positions) or self.previous.contains(positions):
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, raw_record: bytes) -> None:
+        """Remember a record, only once it is queued, so a failed push can be retried"""
+        if time.monotonic() >= self._rotate_at or self.current.inserted >= self.capacity:
+            self._rotate()
+        self.current.add(self._positions(raw_record))
+
+    def claim(self, raw_records: List[str]) -> List[bool]:
+        """
+        For every record whether it is new, duplicates within the list and records
+        claimed by a push still in progress included. The new ones are claimed until
+        remember or release, without an await in between nothing can claim them first.
+        """
+        fresh = []
+        for raw in raw_records:
+            if raw in self._claimed:
+                self.duplicates += 1
+                fresh.append(False)
+            elif self.seen(raw.encode("utf-8")):
+                fresh.append(False)
+            else:
+                self._claimed.add(raw)
+                fresh.append(True)
+        return fresh
+
+    def remember(self, raw_records: List[str]) -> None:
+        """Keep claimed records in the filters, they were queued"""
+        for raw in raw_records:
+            self.add(raw.encode("utf-8"))
+            self._claimed.discard(raw)
+
+    def release(self, raw_records: List[str]) -> None:
+        """Give up claimed records that were not queued, a retry of them is new"""
+        for raw in raw_records:
+            self._claimed.discard(raw)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """Estimated probability that a new record is taken for a duplicate"""
+        return 1 - (1 - self.current.false_positive_rate) * (1 - self.previous.false_positive_rate)
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "capacity": self.capacity,
+            "memory_bytes": len(self.current.bits) + len(self.previous.bits),
+            "remembered": self.current.inserted + self.previous.inserted,
+            "claimed": len(self._claimed),
+            "duplicates": self.duplicates,
+            "rotations": self.rotations,
+            "false_positive_rate": self.false_positive_rate,
+        }
+
+    def _positions(self, raw_record: bytes) -> List[int]:
+        # Double hashing, the bit positions come from the two halves of one digest
+        digest = hashlib.blake2b(raw_record, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def _rotate(self):
+        logging.info(
+            f"Dedup filter rotated after {self.current.inserted} records, {self.duplicates} duplicates "
+            f"dropped so far, estimated false positive rate {self.false_positive_rate:.2e}"
+        )
+        self.previous = self.current
+        self.current = BloomFilter(self.size, self.hashes)
+        self.rotations += 1
+        self._rotate_at = time.monotonic() + self.window
@@ -0,0 +1,165 @@
+import json
+import zlib
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.entities.processed_agent_data import ProcessedAgentData
+
+processed_agent_data_list = TypeAdapter(List[ProcessedAgentData])
+
+# Rejected records reported with their errors, beyond that only counted
+MAX_REPORTED_REJECTIONS = 1000
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+class IngestReport:
+    """Per-record outcome of a bulk request: accepted count and the rejected records"""
+
+    def __init__(self, position: str = "index") -> None:
+        self.position = position
+        self.accepted = 0
+        self.rejected = 0
+        self.rejections: List[dict] = []
+
+    def reject(self, position: int, errors: list) -> None:
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append({self.position: position, "errors": errors})
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ok",
+            # Kept for clients that only read the number of queued records
+            "count": self.accepted,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejections": self.rejections,
+        }
+
+
+def validate_batch(body: bytes) -> Tuple[List[ProcessedAgentData], IngestReport]:
+    """
+    Validate a JSON array of records one by one, invalid records do not reject the others.
+    Raises ValueError if the body is not a JSON array at all.
+    """
+    report = IngestReport()
+    try:
+        # Fast path, the whole array is valid
+        records = processed_agent_data_list.validate_json(body)
+        report.accepted = len(records)
+        return records, report
+    except ValidationError:
+        pass
+
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON body: {e}")
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of records")
+    records = []
+    for index, item in enumerate(items):
+        try:
+            records.append(ProcessedAgentData.model_validate(item))
+            report.accepted += 1
+        except ValidationError as e:
+            report.reject(index, _errors(e))
+    return records, report
+
+
+async def read_body(chunks: AsyncIterator[bytes], max_size: int) -> bytes:
+    """The whole request body, raises BodyTooLarge as soon as more than max_size bytes arrived"""
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > max_size:
+            raise BodyTooLarge(f"Body larger than {max_size} bytes")
+    return bytes(body)
+
+
+def decode_body(body: bytes, gzipped: bool, max_size: int) -> bytes:
+    """
+    The request body, decompressed without ever holding more than max_size bytes of it.
+    Raises BodyTooLarge beyond max_size and zlib.error on a broken gzip body.
+    """
+    if not gzipped:
+        if len(body) > max_size:
+            raise BodyTooLarge(f"Body larger than {max_size} bytes")
+        return body
+    output = b""
+    # A gzip body may hold several members, as gzip.decompress allows
+    while body:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        output += decompressor.decompress(body, max_size + 1 - len(output))
+        if len(output) > max_size:
+            raise BodyTooLarge(f"Body decompresses to more than {max_size} bytes")
+        if not decompressor.eof:
+            raise zlib.error("Incomplete gzip body")
+        body = decompressor.unused_data
+    return output
+
+
+async def iter_ndjson_records(
+    chunks: AsyncIterator[bytes], report: IngestReport, gzipped: bool = False, max_line: int = 1 << 20
+) -> AsyncIterator[str]:
+    """
+    Validate newline delimited JSON records as the chunks of the body arrive and yield
+    every valid one as canonical JSON. Only the current incomplete line is buffered.
+    Raises zlib.error on a broken gzip body and BodyTooLarge on a line longer than
+    max_line bytes, after the records before the broken part.
+    """
+    if gzipped:
+        chunks = _gunzip_chunks(chunks, max_line)
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        if b"\n" not in chunk:
+            # A long record arrives in several chunks, no need to split it every time
+            pending += chunk
+        else:
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                line_number += 1
+                record = _validate_line(line, line_number, report)
+                if record is not None:
+                    yield record
+        if len(pending) > max_line:
+            raise BodyTooLarge(f"Line {line_number + 1} is longer than {max_line} bytes")
+    record = _validate_line(pending, line_number + 1, report)
+    if record is not None:
+        yield record
+
+
+async def _gunzip_chunks(chunks: AsyncIterator[bytes], piece_size: int) -> AsyncIterator[bytes]:
+    # At most piece_size bytes per step, a small chunk may inflate to a huge one. Like
+    # decode_body, a member that ends is followed by the next one
+    decompressor = None
+    async for chunk in chunks:
+        while chunk:
+            if decompressor is None or decompressor.eof:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            yield decompressor.decompress(chunk, piece_size)
+            chunk = decompressor.unconsumed_tail or decompressor.unused_data
+    if decompressor is not None and not decompressor.eof:
+        raise zlib.error("Incomplete gzip body")
+
+
+def _validate_line(line: bytes, line_number: int, report: IngestReport):
+    if not line.strip():
+        return None
+    try:
+        record = ProcessedAgentData.model_validate_json(line).model_dump_json()
+    except ValidationError as e:
+        report.reject(line_number, _errors(e))
+        return None
+    report.accepted += 1
+    return record
+
+
+def _errors(error: ValidationError) -> list:
+    # Without the input, a rejected backfill does not come back in the response
+    return error.errors(include_url=False, include_context=False, include_input=False)
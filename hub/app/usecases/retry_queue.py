@@ -0,0 +1,147 @@
+import logging
+import os
+import struct
+from collections import deque
+from typing import Deque, List, Optional
+
+MAGIC = b"HUBRETR1"
+# magic, offset of the oldest unread batch, batches dropped for lack of space
+HEADER = struct.Struct("<8sQQ")
+RECORD = struct.Struct("<I")  # payload length
+COPY_SIZE = 1 << 20
+
+
+class RetryQueue:
+    """
+    Batches the store refused, replayed oldest first.
+    Up to max_batches stay in memory, further ones are appended to the spill file, and
+    once anything is spilled new batches follow it there, so the order is kept. The file
+    is append-only, the header holds the offset of the oldest unread batch, so spilled
+    batches survive a restart. A file that would grow past max_spill_bytes is rewritten
+    without the batches already replayed, the oldest waiting ones are dropped until a
+    quarter of it is free. A batch is stored as its records separated by newlines,
+    canonical JSON records never contain one.
+    """
+
+    def __init__(self, max_batches: int, spill_filename: str, max_spill_bytes: int) -> None:
+        self.max_batches = max_batches
+        self.spill_filename = spill_filename
+        self.max_spill_bytes = max_spill_bytes
+        self._memory: Deque[List[bytes]] = deque()
+
+        self._fd = os.open(spill_filename, os.O_RDWR | os.O_CREAT, 0o644)
+        header = os.pread(self._fd, HEADER.size, 0)
+        if len(header) == HEADER.size and header[: len(MAGIC)] == MAGIC:
+            _, self._read_offset, self.dropped = HEADER.unpack(header)
+        else:
+            self._read_offset, self.dropped = HEADER.size, 0
+            os.ftruncate(self._fd, HEADER.size)
+            self._write_header()
+        self._end = os.fstat(self._fd).st_size
+        self.spilled = self._count_spilled()
+        if self.spilled:
+            logging.info(f"{self.spilled} batches from {spill_filename} are waiting for the store")
+
+    def __len__(self) -> int:
+        return len(self._memory) + self.spilled
+
+    @property
+    def spilled_bytes(self) -> int:
+        return self._end - self._read_offset
+
+    def append(self, batch: List[bytes]) -> None:
+        if not self.spilled and len(self._memory) < self.max_batches:
+            self._memory.append(batch)
+            return
+        payload = b"\n".join(batch)
+        os.pwrite(self._fd, RECORD.pack(len(payload)) + payload, self._end)
+        self._end += RECORD.size + len(payload)
+        self.spilled += 1
+        if self._end - HEADER.size > self.max_spill_bytes:
+            # The free quarter spares a rewrite for every further batch
+            while self.spilled > 1 and self.spilled_bytes > self.max_spill_bytes * 3 // 4:
+                self._skip_spilled()
+                self.dropped += 1
+                logging.error(f"Retry spill file {self.spill_filename} is full, oldest batch dropped")
+            self._compact()
+        self._write_header()
+
+    def peek(self) -> Optional[List[bytes]]:
+        """The oldest batch, it stays queued until pop()"""
+        if self._memory:
+            return self._memory[0]
+        if not self.spilled:
+            return None
+        (length,) = RECORD.unpack(os.pread(self._fd, RECORD.size, self._read_offset))
+        payload = os.pread(self._fd, length, self._read_offset + RECORD.size)
+        return payload.split(b"\n")
+
+    def pop(self) -> None:
+        """Remove the oldest batch after it reached the store"""
+        if self._memory:
+            self._memory.popleft()
+            return
+        if not self.spilled:
+            return
+        self._skip_spilled()
+        if not self.spilled:
+            # Everything is replayed, the file starts over
+            self._read_offset = self._end = HEADER.size
+            os.ftruncate(self._fd, HEADER.size)
+        self._write_header()
+
+    def close(self) -> None:
+        """Keep the batches held in memory in the spill file for the next start"""
+        batches = list(self._memory)
+        self._memory.clear()
+        self.max_batches = 0
+        spilled = self.spilled
+        if spilled:
+            # Batches in memory are older than the spilled ones
+            tail = os.pread(self._fd, self._end - self._read_offset, self._read_offset)
+            self._read_offset = self._end = HEADER.size
+            self.spilled = 0
+        for batch in batches:
+            self.append(batch)
+        if spilled:
+            os.pwrite(self._fd, tail, self._end)
+            self._end += len(tail)
+            self.spilled += spilled
+        os.ftruncate(self._fd, self._end)
+        self._write_header()
+        os.close(self._fd)
+
+    def _skip_spilled(self) -> None:
+        (length,) = RECORD.unpack(os.pread(self._fd, RECORD.size, self._read_offset))
+        self._read_offset += RECORD.size + length
+        self.spilled -= 1
+
+    def _compact(self) -> None:
+        """Replace the spill file by one holding only the waiting batches"""
+        temporary = f"{self.spill_filename}.tmp"
+        fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.pwrite(fd, HEADER.pack(MAGIC, HEADER.size, self.dropped), 0)
+        end = HEADER.size
+        for offset in range(self._read_offset, self._end, COPY_SIZE):
+            end += os.pwrite(fd, os.pread(self._fd, min(COPY_SIZE, self._end - offset), offset), end)
+        # Atomic, a crash leaves either the old file or the complete new one
+        os.replace(temporary, self.spill_filename)
+        os.close(self._fd)
+        self._fd = fd
+        self._read_offset, self._end = HEADER.size, end
+
+    def _count_spilled(self) -> int:
+        count = 0
+        offset = self._read_offset
+        while offset + RECORD.size <= self._end:
+            (length,) = RECORD.unpack(os.pread(self._fd, RECORD.size, offset))
+            if offset + RECORD.size + length > self._end:
+                # Torn write of the last batch, it is dropped
+                break
+            offset += RECORD.size + length
+            count += 1
+        self._end = offset
+        return count
+
+    def _write_header(self) -> None:
+        os.pwrite(self._fd, HEADER.pack(MAGIC, self._read_offset, self.dropped), 0)
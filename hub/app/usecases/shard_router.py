@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import math
+from bisect import bisect
+from typing import Dict, List, Optional, Sequence
+
+import pydantic_core
+
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.batch_flusher import BatchFlusher
+from app.usecases.deduplicator import Deduplicator
+
+SHARD_KEYS = ("user_id", "cell")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto nodes. Every node owns replicas points on the ring,
+    a key belongs to the first point after its hash. Adding a node moves only the keys
+    the new node takes over, about 1/n of them.
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = 100) -> None:
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key: str) -> str:
+        index = bisect(self._hashes, _hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+class ShardRouter:
+    """
+    Spreads the records over store shards, every shard has its own BatchFlusher with its
+    own record queue, batches, retry queue and circuit breaker, so a slow or failing
+    shard only holds up its own records.
+    A record goes to the shard of its user_id, with shard_key "cell" or without a user_id
+    to the shard of the cell_size by cell_size degrees cell its GPS point is in.
+    With priority flushers, records in one of priority_states take the priority lane of
+    their shard instead, it does not wait for a batch of routine samples to fill up.
+    With a deduplicator, records seen or being queued already are dropped, the others
+    are claimed before they are queued and remembered once the push succeeded.
+    """
+
+    def __init__(
+        self,
+        flushers: Dict[str, BatchFlusher],
+        shard_key: str = "user_id",
+        cell_size: float = 0.1,
+        deduplicator: Optional[Deduplicator] = None,
+        priority_flushers: Optional[Dict[str, BatchFlusher]] = None,
+        priority_states: Sequence[str] = ("pothole", "bump"),
+    ) -> None:
+        if shard_key not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key {shard_key}, expected one of {SHARD_KEYS}")
+        self.flushers = flushers
+        self.shard_key = shard_key
+        self.cell_size = cell_size
+        self.deduplicator = deduplicator
+        self.priority_flushers = priority_flushers
+        self.priority_states = frozenset(priority_states)
+        self.ring = HashRing(list(flushers))
+
+    async def push(self, processed_agent_data_batch: List[ProcessedAgentData]):
+        """Queue records for their shards"""
+        raw_records = [item.model_dump_json() for item in processed_agent_data_batch]
+        if self.deduplicator is not None:
+            fresh = self.deduplicator.claim(raw_records)
+            processed_agent_data_batch = [
+                item for item, new in zip(processed_agent_data_batch, fresh) if new
+            ]
+            raw_records = [raw for raw, new in zip(raw_records, fresh) if new]
+        if not self._routed():
+            await self._push_lanes({self._single(): raw_records})
+            return
+        lanes: Dict[BatchFlusher, List[str]] = {}
+        for item, raw in zip(processed_agent_data_batch, raw_records):
+            agent_data = item.agent_data
+            flusher = self._flusher(
+                item.road_state, agent_data.user_id, agent_data.gps.latitude, agent_data.gps.longitude
+            )
+            lanes.setdefault(flusher, []).append(raw)
+        await self._push_lanes(lanes)
+
+    async def push_raw(self, raw_records: List[str]):
+        """Queue records that are validated and serialized as canonical JSON already"""
+        if self.deduplicator is not None:
+            fresh = self.deduplicator.claim(raw_records)
+            raw_records = [raw for raw, new in zip(raw_records, fresh) if new]
+        if not self._routed() or not raw_records:
+            await self._push_lanes({self._single(): raw_records})
+            return
+        # The shard keys are in the records, one parse of the whole chunk reads them
+        records = pydantic_core.from_json("[" + ",".join(raw_records) + "]")
+        lanes: Dict[BatchFlusher, List[str]] = {}
+        for raw, record in zip(raw_records, records):
+            agent_data = record["agent_data"]
+            gps = agent_data["gps"]
+            flusher = self._flusher(
+                record["road_state"], agent_data.get("user_id"), gps["latitude"], gps["longitude"]
+            )
+            lanes.setdefault(flusher, []).append(raw)
+        await self._push_lanes(lanes)
+
+    async def start(self):
+        await asyncio.gather(*(flusher.start() for flusher in self._all_flushers()))
+
+    async def stop(self):
+        """Flush every shard and stop the flushers"""
+        await asyncio.gather(*(flusher.stop() for flusher in self._all_flushers()))
+
+    def _routed(self) -> bool:
+        return len(self.flushers) > 1 or self.priority_flushers is not None
+
+    def _flusher(
+        self, road_state: str, user_id: Optional[int], latitude: float, longitude: float
+    ) -> BatchFlusher:
+        if len(self.flushers) == 1:
+            shard = next(iter(self.flushers))
+        else:
+            shard = self.ring.node(self._key(user_id, latitude, longitude))
+        if self.priority_flushers is not None and road_state in self.priority_states:
+            return self.priority_flushers[shard]
+        return self.flushers[shard]
+
+    def _key(self, user_id: Optional[int], latitude: float, longitude: float) -> str:
+        if self.shard_key == "user_id" and user_id is not None:
+            return f"user:{user_id}"
+        return f"cell:{math.floor(latitude / self.cell_size)}:{math.floor(longitude / self.cell_size)}"
+
+    def _single(self) -> BatchFlusher:
+        return next(iter(self.flushers.values()))
+
+    def _all_flushers(self) -> List[BatchFlusher]:
+        return [*self.flushers.values(), *(self.priority_flushers or {}).values()]
+
+    async def _push_lanes(self, lanes: Dict[BatchFlusher, List[str]]):
+        try:
+            results = await asyncio.gather(
+                *(flusher.push_raw(records) for flusher, records in lanes.items()), return_exceptions=True
+            )
+        except BaseException:
+            # Cancelled, a retry of the records is not taken for a duplicate
+            if self.deduplicator is not None:
+                for records in lanes.values():
+                    self.deduplicator.release(records)
+            raise
+        # The lanes that were queued are remembered even if another one failed, the
+        # records of a failed lane are released for a retry
+        if self.deduplicator is not None:
+            for records, result in zip(lanes.values(), results):
+                if isinstance(result, BaseException):
+                    self.deduplicator.release(records)
+                else:
+                    self.deduplicator.remember(records)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
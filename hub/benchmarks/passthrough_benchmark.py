@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the hub CPU per record between the intake and the store request body.
+Redis is left out, all paths move the same bytes through it.
+Run from hub: python -m benchmarks.passthrough_benchmark
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from app.adapters.store_columns import compress, encode_columns
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+def make_payloads(count):
+    start = datetime(2024, 1, 1)
+    return [
+        json.dumps(
+            {
+                "road_state": random.choice(["normal", "pothole", "bump"]),
+                "agent_data": {
+                    "accelerometer": {
+                        "x": random.uniform(-100, 100),
+                        "y": random.uniform(-100, 100),
+                        "z": random.uniform(15000, 17000),
+                        "air": random.uniform(0, 100),
+                        "noise": random.uniform(0, 100),
+                    },
+                    "gps": {
+                        "latitude": random.uniform(50, 51),
+                        "longitude": random.uniform(30, 31),
+                    },
+                    "timestamp": (start + timedelta(milliseconds=index)).isoformat(),
+                },
+            }
+        )
+        for index in range(count)
+    ]
+
+
+def revalidating_path(payloads):
+    """Intake validation, Redis copy, validation and serialization again for the store"""
+    queued = [
+        ProcessedAgentData.model_validate_json(payload, strict=True).model_dump_json()
+        for payload in payloads
+    ]
+    batch = [ProcessedAgentData.model_validate_json(raw) for raw in queued]
+    return f'[{",".join(item.model_dump_json() for item in batch)}]'.encode("utf-8")
+
+
+def passthrough_path(payloads):
+    """Intake validation once, the queued bytes are joined into the store body"""
+    queued = [
+        ProcessedAgentData.model_validate_json(payload, strict=True).model_dump_json().encode("utf-8")
+        for payload in payloads
+    ]
+    return b"[" + b",".join(queued) + b"]"
+
+
+def compressed_passthrough_path(payloads):
+    """The joined bytes compressed with gzip, the default store body"""
+    return compress(passthrough_path(payloads), "gzip")
+
+
+def columns_path(payloads):
+    """The queued records parsed again and packed in columns, compressed with gzip"""
+    queued = [
+        ProcessedAgentData.model_validate_json(payload, strict=True).model_dump_json().encode("utf-8")
+        for payload in payloads
+    ]
+    return compress(encode_columns(queued), "gzip")
+
+
+def run(count, repeat):
+    payloads = make_payloads(count)
+    if json.loads(revalidating_path(payloads)) != json.loads(passthrough_path(payloads)):
+        raise AssertionError("The paths produce different store batches")
+
+    paths = {
+        "validate, queue, revalidate": revalidating_path,
+        "validate once, join bytes": passthrough_path,
+        "join bytes, gzip": compressed_passthrough_path,
+        "pack columns, gzip": columns_path,
+    }
+    baseline = None
+    for name, path in paths.items():
+        best = min(timeit.repeat(lambda: path(payloads), number=1, repeat=repeat)) / count
+        baseline = baseline or best
+        print(
+            f"{name:<30} {best * 1e6:8.2f} us/record {1 / best:10.0f} records/s/core "
+            f"x{baseline / best:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10_000, help="records per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best one is reported")
+    args = parser.parse_args()
+    run(args.count, args.repeat)
@@ -0,0 +1,87 @@
+"""
+Runs the Redis stream queue against an in-process fakeredis server, no Redis needed.
+Checks the consumer group cycle (push, claim, release, ack), the takeover of a dead
+replica's records, the count that wakes the flusher and the pruning of idle consumers,
+for the reply shapes of Redis 6.2 and 7.
+Needs the fakeredis package. Run from hub: python -m benchmarks.stream_queue_harness
+"""
+import argparse
+import asyncio
+import time
+
+import fakeredis
+
+from app.adapters.redis_stream_queue import RedisStreamQueue
+
+VERSIONS = {"6.2": (6, 2), "7": (7,)}
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+async def run_version(version, records: int, claim_timeout: float):
+    server = fakeredis.FakeServer(version=version)
+    redis_client = fakeredis.FakeAsyncRedis(server=server, version=version)
+    first = RedisStreamQueue(redis_client, "hub-a", key="harness", claim_timeout=claim_timeout)
+    second = RedisStreamQueue(redis_client, "hub-b", key="harness", claim_timeout=claim_timeout)
+    await first.open()
+    await second.open()
+
+    raw_records = [f'{{"index":{index}}}' for index in range(records)]
+    waiting = await first.push(raw_records)
+    check(waiting == records, f"push reported {waiting} waiting records, expected {records}")
+
+    half = records // 2
+    claimed = await first.claim(half)
+    check([raw for _, raw in claimed] == [raw.encode() for raw in raw_records[:half]], "claim out of order")
+    waiting = await first.push([])
+    check(waiting == records - half, f"claimed records counted as waiting: {waiting}")
+
+    # A released batch comes back first, before anything new
+    await first.release(claimed)
+    again = await first.claim(half)
+    check(again == claimed, "released records were not claimed again first")
+    await first.ack([record_id for record_id, _ in again])
+
+    # hub-a dies holding records, hub-b takes them over once they are stale
+    stranded = await first.claim(1)
+    await asyncio.sleep(claim_timeout)
+    taken = await second.claim(records)
+    check(taken[: len(stranded)] == stranded, "stale records of a dead consumer were not reclaimed")
+    check(len(taken) == records - half, f"hub-b claimed {len(taken)} records, expected {records - half}")
+    await second.ack([record_id for record_id, _ in taken])
+    check(await redis_client.xlen("harness") == 0, "acknowledged records left in the stream")
+
+    # A pending record deleted from the stream is acknowledged, not read again forever
+    await first.push(raw_records[:3])
+    claimed = await first.claim(3)
+    await redis_client.xdel("harness", claimed[1][0])
+    again = await first.claim(3)
+    check(again == [claimed[0], claimed[2]], "a deleted pending record was returned")
+    pending = (await redis_client.xpending("harness", "hub"))["pending"]
+    check(pending == 2, f"a deleted pending record is still pending: {pending}")
+    await first.ack([record_id for record_id, _ in again])
+
+    # The replica replacing hub-a prunes it, it has nothing pending and is idle
+    await asyncio.sleep(claim_timeout)
+    replacement = RedisStreamQueue(redis_client, "hub-c", key="harness", claim_timeout=claim_timeout)
+    await replacement.open()
+    names = {consumer["name"] for consumer in await redis_client.xinfo_consumers("harness", "hub")}
+    check(b"hub-a" not in names, f"idle consumer hub-a was not removed: {names}")
+
+
+async def run(records: int, claim_timeout: float):
+    for name, version in VERSIONS.items():
+        started = time.perf_counter()
+        await run_version(version, records, claim_timeout)
+        print(f"Redis {name:<4} ok {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100, help="records pushed per version")
+    parser.add_argument("--claim-timeout", type=float, default=0.05, help="seconds until a record is stale")
+    args = parser.parse_args()
+    asyncio.run(run(args.records, args.claim_timeout))
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 def try_parse_int(value: str):
@@ -12,15 +13,76 @@ def try_parse_int(value: str):
 STORE_API_HOST = os.environ.get("STORE_API_HOST") or "localhost"
 STORE_API_PORT = try_parse_int(os.environ.get("STORE_API_PORT")) or 8000
 STORE_API_BASE_URL = f"http://{STORE_API_HOST}:{STORE_API_PORT}"
+# Store shards as comma separated base URLs, records are spread over them by consistent hashing
+STORE_API_BASE_URLS = [
+    url.strip()
+    for url in (os.environ.get("STORE_API_BASE_URLS") or STORE_API_BASE_URL).split(",")
+    if url.strip()
+]
+# Shard of a record: "user_id" (records without one go by cell) or "cell", the GPS grid cell
+SHARD_KEY = os.environ.get("SHARD_KEY") or "user_id"
+SHARD_CELL_MILLIDEGREES = try_parse_int(os.environ.get("SHARD_CELL_MILLIDEGREES")) or 100
+# Connections kept open to the Store API and the timeout of a request in seconds
+STORE_MAX_CONNECTIONS = try_parse_int(os.environ.get("STORE_MAX_CONNECTIONS")) or 10
+STORE_TIMEOUT = try_parse_int(os.environ.get("STORE_TIMEOUT")) or 10
+# Body of a store batch: "json" (the queued records joined) or "columns" (packed, falls
+# back to JSON for an older store)
+STORE_BODY_FORMAT = os.environ.get("STORE_BODY_FORMAT") or "json"
+# Compression of a store body: "gzip", "zstd" (needs the zstandard package) or "none"
+STORE_COMPRESSION = os.environ.get("STORE_COMPRESSION") or "gzip"
 
 # Configure for Redis
 REDIS_HOST = os.environ.get("REDIS_HOST") or "localhost"
 REDIS_PORT = try_parse_int(os.environ.get("REDIS_PORT")) or 6379
 
+# Queue of records waiting for the store: "list" or "stream" (consumer group, for several hubs)
+RECORD_QUEUE = os.environ.get("RECORD_QUEUE") or "list"
+# Name of this hub in the consumer group, unique per replica and kept across restarts so a
+# restarted hub takes over its own pending records. Set it for several hubs on one host.
+HUB_CONSUMER_NAME = os.environ.get("HUB_CONSUMER_NAME") or socket.gethostname()
+# Records unacknowledged for this long are reclaimed by another consumer
+STREAM_CLAIM_TIMEOUT_MS = try_parse_int(os.environ.get("STREAM_CLAIM_TIMEOUT_MS")) or 30000
+
 # Configure for hub logic
+# Initial number of records written to the store at once, adapted to the store latency
 BATCH_SIZE = try_parse_int(os.environ.get("BATCH_SIZE")) or 20
+BATCH_MIN_SIZE = try_parse_int(os.environ.get("BATCH_MIN_SIZE")) or 1
+BATCH_MAX_SIZE = try_parse_int(os.environ.get("BATCH_MAX_SIZE")) or 1000
+# Maximum time in milliseconds records wait in Redis for their batch to fill up
+BATCH_LINGER_MS = try_parse_int(os.environ.get("BATCH_LINGER_MS")) or 1000
+# Road states written to the store right away instead of in batches, "none" turns it off
+PRIORITY_ROAD_STATES = [
+    state.strip()
+    for state in (os.environ.get("PRIORITY_ROAD_STATES") or "pothole,bump").split(",")
+    if state.strip() and state.strip() != "none"
+]
+# Records of a streamed request queued in Redis together
+STREAM_CHUNK_RECORDS = try_parse_int(os.environ.get("STREAM_CHUNK_RECORDS")) or 500
+# Largest batch request body after decompression and longest line of a streamed one
+MAX_BODY_MB = try_parse_int(os.environ.get("MAX_BODY_MB")) or 64
+MAX_LINE_KB = try_parse_int(os.environ.get("MAX_LINE_KB")) or 1024
+# Store write latency the batch size is adapted to
+STORE_TARGET_LATENCY_MS = try_parse_int(os.environ.get("STORE_TARGET_LATENCY_MS")) or 500
+
+# Records seen within this many seconds are dropped as duplicates, 0 turns it off
+DEDUP_WINDOW_S = try_parse_int(os.environ.get("DEDUP_WINDOW_S"))
+DEDUP_WINDOW_S = 600 if DEDUP_WINDOW_S is None else DEDUP_WINDOW_S
+# Records the dedup filter remembers per window and its false positive rate in parts per million
+DEDUP_CAPACITY = try_parse_int(os.environ.get("DEDUP_CAPACITY")) or 1000000
+DEDUP_FALSE_POSITIVE_PPM = try_parse_int(os.environ.get("DEDUP_FALSE_POSITIVE_PPM")) or 100
+
+# Batches the store refused: kept in memory, then appended to the spill file up to its size
+RETRY_MEMORY_BATCHES = try_parse_int(os.environ.get("RETRY_MEMORY_BATCHES")) or 100
+RETRY_SPILL_FILENAME = os.environ.get("RETRY_SPILL_FILENAME") or "retry_spill.bin"
+RETRY_SPILL_MAX_MB = try_parse_int(os.environ.get("RETRY_SPILL_MAX_MB")) or 256
+# Store failures in a row that open the circuit, and the backoff between attempts
+BREAKER_FAILURE_THRESHOLD = try_parse_int(os.environ.get("BREAKER_FAILURE_THRESHOLD")) or 5
+RETRY_BACKOFF_MS = try_parse_int(os.environ.get("RETRY_BACKOFF_MS")) or 500
+RETRY_BACKOFF_MAX_MS = try_parse_int(os.environ.get("RETRY_BACKOFF_MAX_MS")) or 60000
 
 # MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
 MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "processed_agent_data_topic"
+# Longest wait of the MQTT network thread for its records to be queued in Redis
+MQTT_PUSH_TIMEOUT_MS = try_parse_int(os.environ.get("MQTT_PUSH_TIMEOUT_MS")) or 10000
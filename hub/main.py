@@ -1,20 +1,70 @@
+import asyncio
+import concurrent.futures
 import logging
-from typing import List
+import os
+import re
+import zlib
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
 
-from fastapi import FastAPI
-from redis import Redis
+from fastapi import FastAPI, HTTPException, Request
+from redis.asyncio import Redis
 import paho.mqtt.client as mqtt
 
-from app.adapters.store_api_adapter import StoreApiAdapter
+from app.adapters.async_store_api_adapter import AsyncStoreApiAdapter
+from app.adapters.redis_list_queue import RedisListQueue
+from app.adapters.redis_stream_queue import RedisStreamQueue
 from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.batch_flusher import BatchFlusher
+from app.usecases.circuit_breaker import CircuitBreaker
+from app.usecases.deduplicator import Deduplicator
+from app.usecases.retry_queue import RetryQueue
+from app.usecases.shard_router import ShardRouter
+from app.usecases.ingest import (
+    BodyTooLarge,
+    IngestReport,
+    decode_body,
+    iter_ndjson_records,
+    processed_agent_data_list,
+    read_body,
+    validate_batch,
+)
 from config import (
-    STORE_API_BASE_URL,
+    STORE_API_BASE_URLS,
+    SHARD_KEY,
+    SHARD_CELL_MILLIDEGREES,
+    DEDUP_WINDOW_S,
+    DEDUP_CAPACITY,
+    DEDUP_FALSE_POSITIVE_PPM,
+    PRIORITY_ROAD_STATES,
+    STORE_MAX_CONNECTIONS,
+    STORE_TIMEOUT,
+    STORE_BODY_FORMAT,
+    STORE_COMPRESSION,
     REDIS_HOST,
     REDIS_PORT,
     BATCH_SIZE,
+    STREAM_CHUNK_RECORDS,
+    MAX_BODY_MB,
+    MAX_LINE_KB,
+    BATCH_LINGER_MS,
+    BATCH_MIN_SIZE,
+    BATCH_MAX_SIZE,
+    STORE_TARGET_LATENCY_MS,
+    RETRY_MEMORY_BATCHES,
+    RETRY_SPILL_FILENAME,
+    RETRY_SPILL_MAX_MB,
+    BREAKER_FAILURE_THRESHOLD,
+    RETRY_BACKOFF_MS,
+    RETRY_BACKOFF_MAX_MS,
+    RECORD_QUEUE,
+    HUB_CONSUMER_NAME,
+    STREAM_CLAIM_TIMEOUT_MS,
     MQTT_TOPIC,
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
+    MQTT_PUSH_TIMEOUT_MS,
 )
 
 # Configure logging settings
@@ -26,31 +76,201 @@ logging.basicConfig(
         logging.FileHandler("app.log"),  # Save log messages to a file
     ],
 )
-# Create an instance of the Redis using the configuration
+# Create an instance of the Redis using the configuration, its pool lives in the event loop
 redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT)
-# Create an instance of the StoreApiAdapter using the configuration
-store_adapter = StoreApiAdapter(api_base_url=STORE_API_BASE_URL)
-# Create an instance of the AgentMQTTAdapter using the configuration
+
+
+def make_record_queue(name: str, suffix: str):
+    # Records wait in Redis for the store writer, a stream can be shared by hub replicas
+    if RECORD_QUEUE == "stream":
+        return RedisStreamQueue(
+            redis_client,
+            consumer=HUB_CONSUMER_NAME,
+            key=f"{name}_stream{suffix}",
+            claim_timeout=STREAM_CLAIM_TIMEOUT_MS / 1000,
+        )
+    return RedisListQueue(redis_client, key=f"{name}{suffix}")
+
+
+def make_batch_flushers(
+    api_base_url: str, sharded: bool
+) -> Tuple[BatchFlusher, Optional[BatchFlusher]]:
+    """
+    Store writers of one shard, for routine records and for the priority lane.
+    Both share the store adapter and the circuit breaker, their queues are named after the shard.
+    """
+    shard = re.sub(r"\W+", "_", urlsplit(api_base_url).netloc) if sharded else ""
+    suffix = f":{shard}" if shard else ""
+    # Create an instance of the AsyncStoreApiAdapter using the configuration
+    store_adapter = AsyncStoreApiAdapter(
+        api_base_url=api_base_url,
+        max_connections=STORE_MAX_CONNECTIONS,
+        timeout=STORE_TIMEOUT,
+        body_format=STORE_BODY_FORMAT,
+        compression=STORE_COMPRESSION,
+    )
+    circuit_breaker = CircuitBreaker(
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        backoff_base=RETRY_BACKOFF_MS / 1000,
+        backoff_max=RETRY_BACKOFF_MAX_MS / 1000,
+    )
+    spill_root, spill_ext = os.path.splitext(RETRY_SPILL_FILENAME)
+    # Writes the queued records to the store in batches
+    batch_flusher = BatchFlusher(
+        make_record_queue("processed_agent_data", suffix),
+        store_adapter,
+        batch_size=BATCH_SIZE,
+        linger=BATCH_LINGER_MS / 1000,
+        min_batch_size=BATCH_MIN_SIZE,
+        max_batch_size=BATCH_MAX_SIZE,
+        target_latency=STORE_TARGET_LATENCY_MS / 1000,
+        retry_queue=RetryQueue(
+            max_batches=RETRY_MEMORY_BATCHES,
+            spill_filename=f"{spill_root}.{shard}{spill_ext}" if shard else RETRY_SPILL_FILENAME,
+            max_spill_bytes=RETRY_SPILL_MAX_MB * 1024 * 1024,
+        ),
+        circuit_breaker=circuit_breaker,
+    )
+    if not PRIORITY_ROAD_STATES:
+        return batch_flusher, None
+    # Anomalies are written as soon as they arrive, a refused batch goes back to Redis
+    priority_flusher = BatchFlusher(
+        make_record_queue("processed_agent_data_priority", suffix),
+        store_adapter,
+        batch_size=BATCH_SIZE,
+        linger=BATCH_LINGER_MS / 1000,
+        min_batch_size=BATCH_MIN_SIZE,
+        max_batch_size=BATCH_MAX_SIZE,
+        target_latency=STORE_TARGET_LATENCY_MS / 1000,
+        circuit_breaker=circuit_breaker,
+        wake_size=1,
+    )
+    return batch_flusher, priority_flusher
+
+
+# One store writer per shard, a single store keeps the queue names it always had
+shard_flushers = {
+    url: make_batch_flushers(url, len(STORE_API_BASE_URLS) > 1) for url in STORE_API_BASE_URLS
+}
+store_router = ShardRouter(
+    {url: batch_flusher for url, (batch_flusher, _) in shard_flushers.items()},
+    shard_key=SHARD_KEY,
+    cell_size=SHARD_CELL_MILLIDEGREES / 1000,
+    # MQTT redeliveries and edge retries are dropped before they reach Redis
+    deduplicator=Deduplicator(
+        window=DEDUP_WINDOW_S,
+        capacity=DEDUP_CAPACITY,
+        error_rate=DEDUP_FALSE_POSITIVE_PPM / 1_000_000,
+    )
+    if DEDUP_WINDOW_S
+    else None,
+    priority_flushers={url: priority for url, (_, priority) in shard_flushers.items()}
+    if PRIORITY_ROAD_STATES
+    else None,
+    priority_states=PRIORITY_ROAD_STATES,
+)
+
+
+# Event loop of the app, the MQTT network thread hands its records over to it
+event_loop: asyncio.AbstractEventLoop = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    await store_router.start()
+    # Connect to the MQTT broker and start listening for messages
+    client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
+    client.loop_start()
+    yield
+    client.disconnect()
+    # The network thread may be waiting in on_message for a push on this loop,
+    # joining it on the loop would deadlock
+    await asyncio.to_thread(client.loop_stop)
+    # Records still queued in Redis are written before the hub exits
+    await store_router.stop()
+    for batch_flusher in store_router.flushers.values():
+        await batch_flusher.store_gateway.close()
+    await redis_client.aclose()
+
 
 # FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/processed_agent_data/")
 async def save_processed_agent_data(processed_agent_data: ProcessedAgentData):
-    redis_client.lpush("processed_agent_data", processed_agent_data.model_dump_json())
-    if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        for _ in range(BATCH_SIZE):
-            processed_agent_data = ProcessedAgentData.model_validate_json(
-                redis_client.lpop("processed_agent_data")
-            )
-            processed_agent_data_batch.append(processed_agent_data)
-        print(processed_agent_data_batch)
-        store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
+    await store_router.push([processed_agent_data])
     return {"status": "ok"}
 
 
+@app.post("/processed_agent_data/batch/")
+async def save_processed_agent_data_batch(request: Request):
+    """
+    Accept a JSON array of records, optionally gzip compressed (Content-Encoding: gzip).
+    Valid records are queued, invalid ones are reported by their index in the array.
+    """
+    max_size = MAX_BODY_MB * 1024 * 1024
+    gzipped = request.headers.get("content-encoding") == "gzip"
+    content_length = request.headers.get("content-length", "")
+    try:
+        # A body announced too large is refused before it is read, one that grows too
+        # large while it arrives as soon as it passes the limit
+        if content_length.isdigit() and int(content_length) > max_size:
+            raise BodyTooLarge(f"Body larger than {max_size} bytes")
+        body = decode_body(await read_body(request.stream(), max_size), gzipped, max_size)
+        processed_agent_data_batch, report = validate_batch(body)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await store_router.push(processed_agent_data_batch)
+    return report.as_dict()
+
+
+@app.post("/processed_agent_data/stream/")
+async def save_processed_agent_data_stream(request: Request):
+    """
+    Accept newline delimited JSON records (application/x-ndjson), optionally gzip compressed.
+    Records are validated and queued while the body arrives, invalid ones are reported
+    by their line number.
+    """
+    report = IngestReport(position="line")
+    gzipped = request.headers.get("content-encoding") == "gzip"
+    raw_records: List[str] = []
+    try:
+        async for raw_record in iter_ndjson_records(
+            request.stream(), report, gzipped, max_line=MAX_LINE_KB * 1024
+        ):
+            raw_records.append(raw_record)
+            if len(raw_records) >= STREAM_CHUNK_RECORDS:
+                await store_router.push_raw(raw_records)
+                raw_records = []
+    except zlib.error as e:
+        # Records before the broken part are queued already
+        await store_router.push_raw(raw_records)
+        raise HTTPException(
+            status_code=400, detail=f"Invalid gzip body after {report.accepted} records: {e}"
+        )
+    except BodyTooLarge as e:
+        await store_router.push_raw(raw_records)
+        raise HTTPException(status_code=413, detail=f"{e}, after {report.accepted} records")
+    await store_router.push_raw(raw_records)
+    return report.as_dict()
+
+
+@app.get("/dedup/")
+async def dedup_stats():
+    """Duplicates dropped so far and the estimated false positive rate of the filter"""
+    if store_router.deduplicator is None:
+        return {"enabled": False}
+    return {"enabled": True, **store_router.deduplicator.stats()}
+
+
 # MQTT
 client = mqtt.Client()
 
@@ -66,31 +286,32 @@ def on_connect(client, userdata, flags, rc):
 def on_message(client, userdata, msg):
     try:
         payload: str = msg.payload.decode("utf-8")
-        # Create ProcessedAgentData instance with the received data
-        processed_agent_data = ProcessedAgentData.model_validate_json(
-            payload, strict=True
-        )
-
-        redis_client.lpush(
-            "processed_agent_data", processed_agent_data.model_dump_json()
+        # A message holds one record or, from a batching edge, a JSON array of records
+        if payload.lstrip().startswith("["):
+            processed_agent_data_batch = processed_agent_data_list.validate_json(
+                payload, strict=True
+            )
+        else:
+            processed_agent_data_batch = [
+                ProcessedAgentData.model_validate_json(payload, strict=True)
+            ]
+        # Waiting for the push keeps the message order and holds the MQTT intake back while Redis is slow
+        future = asyncio.run_coroutine_threadsafe(
+            store_router.push(processed_agent_data_batch), event_loop
         )
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-            for _ in range(BATCH_SIZE):
-                processed_agent_data = ProcessedAgentData.model_validate_json(
-                    redis_client.lpop("processed_agent_data")
-                )
-                processed_agent_data_batch.append(processed_agent_data)
-        store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
+        try:
+            future.result(timeout=MQTT_PUSH_TIMEOUT_MS / 1000)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logging.error(
+                f"Dropped {len(processed_agent_data_batch)} MQTT records, "
+                f"not queued within {MQTT_PUSH_TIMEOUT_MS} ms"
+            )
+            return
         return {"status": "ok"}
     except Exception as e:
         logging.info(f"Error processing MQTT message: {e}")
 
 
-# Connect
 client.on_connect = on_connect
 client.on_message = on_message
-client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
-
-# Start
-client.loop_start()
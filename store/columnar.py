@@ -0,0 +1,138 @@
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Packed columnar batch sent by the hub, see hub/app/adapters/store_columns.py.
+# Little endian: magic, record count, the road state dictionary (count, then length
+# prefixed UTF-8 names) and one code per record, the float64 columns in FLOAT_COLUMNS
+# order, int64 timestamps in microseconds since the epoch and the int16 UTC offsets of
+# the timestamps in minutes, NAIVE_OFFSET for a timestamp without a timezone.
+# A batch with road summaries starts with SUMMARY_MAGIC and ends with the uint32 lengths
+# of the summaries as JSON, 0 for a record without one, followed by those JSON texts.
+COLUMNS_CONTENT_TYPE = "application/x-road-columns"
+MAGIC = b"RDC1"
+SUMMARY_MAGIC = b"RDC2"
+HEADER = struct.Struct("<4sI")
+FLOAT_COLUMNS = ("x", "y", "z", "air", "noise", "latitude", "longitude")
+NAIVE_OFFSET = -32768
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def decompress(body: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Undo the Content-Encoding of a request body.
+    Raises BodyTooLarge as soon as more than max_size bytes were decompressed.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding == "gzip":
+        # gzip bodies may hold several members, like gzip.decompress accepts
+        return _inflate(body, 16 + zlib.MAX_WBITS, max_size, multi_member=True)
+    if encoding == "deflate":
+        return _inflate(body, zlib.MAX_WBITS, max_size, multi_member=False)
+    if encoding == "zstd" and zstandard is not None:
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+            decompressed = reader.read(max_size + 1)
+        if len(decompressed) > max_size:
+            raise BodyTooLarge(f"Decompressed body larger than {max_size} bytes")
+        return decompressed
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding {encoding}")
+
+
+def _inflate(body: bytes, wbits: int, max_size: int, multi_member: bool) -> bytes:
+    output = bytearray()
+    decompressor = zlib.decompressobj(wbits)
+    data = body
+    while data:
+        if decompressor.eof:
+            if not multi_member:
+                raise zlib.error("Trailing data after the compressed body")
+            decompressor = zlib.decompressobj(wbits)
+        # Never more than one byte past the limit, a small bomb cannot expand in memory
+        output += decompressor.decompress(data, max_size + 1 - len(output))
+        if len(output) > max_size:
+            raise BodyTooLarge(f"Decompressed body larger than {max_size} bytes")
+        data = decompressor.unconsumed_tail or decompressor.unused_data
+    if not decompressor.eof:
+        raise EOFError("Compressed body ended before the end of the stream")
+    return bytes(output)
+
+
+def decode_columns(body: bytes) -> List[dict]:
+    """
+    Unpack a columnar batch into rows of the processed_agent_data table.
+    Raises ValueError if the body is not a complete batch.
+    """
+    if len(body) < HEADER.size:
+        raise ValueError("Truncated columns body")
+    magic, count = HEADER.unpack_from(body)
+    if magic not in (MAGIC, SUMMARY_MAGIC):
+        raise ValueError("Not a columns body")
+    offset = HEADER.size
+    state_count = body[offset]
+    offset += 1
+    states = []
+    for _ in range(state_count):
+        length = body[offset]
+        states.append(body[offset + 1 : offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+    codes = body[offset : offset + count]
+    offset += count
+
+    layout = [*((name, "d") for name in FLOAT_COLUMNS), ("timestamp", "q"), ("offset", "h")]
+    if magic == SUMMARY_MAGIC:
+        layout.append(("summary_length", "I"))
+    columns = {}
+    for name, typecode in layout:
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(body[offset : offset + size])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns[name] = column
+        offset += size
+    summaries = [None] * count
+    if magic == SUMMARY_MAGIC:
+        for index, length in enumerate(columns["summary_length"]):
+            if length:
+                summaries[index] = json.loads(body[offset : offset + length])
+                offset += length
+    if offset != len(body) or any(len(column) != count for column in columns.values()):
+        raise ValueError("Columns body does not match its record count")
+    if codes and max(codes) >= len(states):
+        raise ValueError("Road state code out of range")
+
+    rows = []
+    for index in range(count):
+        timestamp = _EPOCH + timedelta(microseconds=columns["timestamp"][index])
+        utc_offset = columns["offset"][index]
+        if utc_offset != NAIVE_OFFSET:
+            timestamp = timestamp.replace(tzinfo=timezone.utc).astimezone(
+                timezone(timedelta(minutes=utc_offset))
+            )
+        row = {name: columns[name][index] for name in FLOAT_COLUMNS}
+        row["road_state"] = states[codes[index]]
+        row["timestamp"] = timestamp
+        row["summary"] = summaries[index]
+        rows.append(row)
+    return rows
@@ -10,4 +10,10 @@ POSTGRES_HOST = os.environ.get("POSTGRES_HOST") or "localhost"
 POSTGRES_PORT = try_parse(int, os.environ.get("POSTGRES_PORT")) or 5432
 POSTGRES_USER = os.environ.get("POSTGRES_USER") or "user"
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASS") or "pass"
-POSTGRES_DB = os.environ.get("POSTGRES_DB") or "test_db"
\ No newline at end of file
+POSTGRES_DB = os.environ.get("POSTGRES_DB") or "test_db"
+# Database of this store, e.g. sqlite:///store_1.db to run several local stores as shards
+DATABASE_URL = os.environ.get("DATABASE_URL") or (
+    f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+# Largest accepted request body, before and after decompression
+MAX_BODY_MB = try_parse(int, os.environ.get("MAX_BODY_MB")) or 64
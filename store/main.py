@@ -1,9 +1,11 @@
 import asyncio
 import json
+import zlib
 from typing import Set, Dict, List, Any
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Body
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, Body
+from fastapi.exceptions import RequestValidationError
 from sqlalchemy import (
     create_engine,
     MetaData,
@@ -13,26 +15,28 @@ from sqlalchemy import (
     String,
     Float,
     DateTime,
+    JSON,
+    inspect,
+    text,
 )
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import select, delete, update
 from datetime import datetime
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
 from pydantic.json import pydantic_encoder
-from config import (
-    POSTGRES_HOST,
-    POSTGRES_PORT,
-    POSTGRES_DB,
-    POSTGRES_USER,
-    POSTGRES_PASSWORD,
-)
+from config import DATABASE_URL, MAX_BODY_MB
 import models
 from models.modelsDB import ProcessedAgentDataInDB
 from models.modelsFastAPI import ProcessedAgentData
+from columnar import BodyTooLarge, COLUMNS_CONTENT_TYPE, UnsupportedEncoding, decode_columns, decompress
 import random
 
-DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-engine = create_engine(DATABASE_URL)
+# SQLite connections are used from the threads of the request handlers
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+)
 metadata = MetaData()
 # Define the ProcessedAgentData table
 processed_agent_data = Table(
@@ -48,9 +52,17 @@ Column("id", Integer, primary_key=True, index=True),
     Column("latitude", Float),
     Column("longitude", Float),
     Column("timestamp", DateTime),
+    # Road summary of a record standing for a window of normal samples
+    Column("summary", JSON, nullable=True),
 )
 SessionLocal = sessionmaker(bind=engine)
 metadata.create_all(engine)
+# Tables created before summaries were stored lack their column
+if "summary" not in {column["name"] for column in inspect(engine).get_columns("processed_agent_data")}:
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE processed_agent_data ADD COLUMN summary JSON"))
+processed_agent_data_list = TypeAdapter(List[ProcessedAgentData])
+ACCEPT_POST = {"Accept-Post": f"application/json, {COLUMNS_CONTENT_TYPE}"}
 
 # FastAPI app setup
 app = FastAPI()
@@ -95,48 +107,111 @@ async def websocket_endpoint(websocket: WebSocket):
             await asyncio.sleep(1)
 
     except WebSocketDisconnect:
-        subscriptions.remove(websocket)
+        subscriptions.discard(websocket)
 
 
 async def send_data_to_subscribers(data):
     """Sending data to all subscribed clients"""
     disconnected_clients = []
-    for websocket in subscriptions:
+    # A copy, clients may subscribe or leave while a send waits
+    for websocket in list(subscriptions):
         try:
             await websocket.send_json(data)
-        except WebSocketDisconnect:
+        except Exception:
             disconnected_clients.append(websocket)
 
     for websocket in disconnected_clients:
-        subscriptions.remove(websocket)
+        subscriptions.discard(websocket)
+
+
+async def read_body(request: Request, max_size: int) -> bytes:
+    """The request body, raises BodyTooLarge before reading more than max_size bytes"""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size:
+        raise BodyTooLarge(f"Body larger than {max_size} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_size:
+            raise BodyTooLarge(f"Body larger than {max_size} bytes")
+    return bytes(body)
 
 
 # FastAPI CRUDL endpoints
 @app.post("/processed_agent_data/")
-async def create_processed_agent_data(data: List[ProcessedAgentData]):
+async def create_processed_agent_data(request: Request, response: Response):
+    # The hub sends packed columns, other clients a JSON array, both maybe compressed.
+    # Accept-Post tells the hub a failed batch was not refused for its format.
+    response.headers.update(ACCEPT_POST)
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if content_type not in ("application/json", COLUMNS_CONTENT_TYPE):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Type {content_type}", headers=ACCEPT_POST)
+    max_size = MAX_BODY_MB * 1024 * 1024
+    try:
+        body = decompress(await read_body(request, max_size), request.headers.get("content-encoding"), max_size)
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e), headers=ACCEPT_POST)
+    except UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=str(e), headers=ACCEPT_POST)
+    except (OSError, EOFError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid compressed body: {e}", headers=ACCEPT_POST)
+
+    if content_type == COLUMNS_CONTENT_TYPE:
+        try:
+            rows = decode_columns(body)
+        except (ValueError, IndexError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid columns body: {e}", headers=ACCEPT_POST)
+    else:
+        try:
+            data = processed_agent_data_list.validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
+        rows = [
+            {
+                "road_state": item.road_state,
+                "x": item.agent_data.accelerometer.x,
+                "y": item.agent_data.accelerometer.y,
+                "z": item.agent_data.accelerometer.z,
+                "air": item.agent_data.accelerometer.air,
+                "noise": item.agent_data.accelerometer.noise,
+                "latitude": item.agent_data.gps.latitude,
+                "longitude": item.agent_data.gps.longitude,
+                "timestamp": item.agent_data.timestamp,
+                "summary": None if item.summary is None else item.summary.model_dump(mode="json"),
+            }
+            for item in data
+        ]
+
     # Insert data to database
     print("Creating processed agent data...")
 
-    with SessionLocal() as session:
-        for item in data:
-            query = processed_agent_data.insert().values(
-                road_state=item.road_state,
-                x=item.agent_data.accelerometer.x,
-                y=item.agent_data.accelerometer.y,
-                z=item.agent_data.accelerometer.z,
-                air=item.agent_data.accelerometer.air,
-                noise=item.agent_data.accelerometer.noise,
-                latitude=item.agent_data.gps.latitude,
-                longitude=item.agent_data.gps.longitude,
-                timestamp=item.agent_data.timestamp,
+    if rows:
+        try:
+            with SessionLocal() as session:
+                # One executemany for the whole batch
+                session.execute(processed_agent_data.insert(), rows)
+                session.commit()
+        except SQLAlchemyError as e:
+            print(f"Error creating processed agent data: {e}")
+            raise HTTPException(status_code=500, detail="Database error", headers=ACCEPT_POST)
+    print("Processed agent data was created!")
+
+    # Send the latest record to subscribers, in the shape of the /ws/ updates
+    if rows:
+        latest = rows[-1]
+        try:
+            await send_data_to_subscribers(
+                {
+                    "latitude": latest["latitude"],
+                    "longitude": latest["longitude"],
+                    "road_state": latest["road_state"] or "normal",
+                    "air": latest["air"],
+                    "noise": latest["noise"],
+                }
             )
-            session.execute(query)
-
-        session.commit()
-        print("Processed agent data was created!")
-
-    # Send data to subscribers
-    await send_data_to_subscribers(data)
+        except Exception as e:
+            # The batch is stored, a failed broadcast must not make the sender send it again
+            print(f"Error sending data to subscribers: {e!r}")
 
 @app.get("/processed_agent_data/{processed_agent_data_id}",
     response_model=ProcessedAgentDataInDB)
@@ -205,6 +280,7 @@ def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAge
             latitude=data.agent_data.gps.latitude,
             longitude=data.agent_data.gps.longitude,
             timestamp=data.agent_data.timestamp,
+            summary=None if data.summary is None else data.summary.model_dump(mode="json"),
         )
 
         session.execute(query)
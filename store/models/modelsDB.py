@@ -1,6 +1,8 @@
 # Database model
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
+from models.modelsFastAPI import RoadSummary
 
 
 class ProcessedAgentDataInDB(BaseModel):
@@ -14,3 +16,4 @@ class ProcessedAgentDataInDB(BaseModel):
     latitude: float
     longitude: float
     timestamp: datetime
+    summary: Optional[RoadSummary] = None
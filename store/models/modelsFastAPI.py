@@ -1,5 +1,6 @@
 # FastAPI models
 from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, field_validator
 
 # FastAPI models
@@ -29,6 +30,22 @@ class AgentData(BaseModel):
         except (TypeError, ValueError):
             raise ValueError("Invalid timestamp format. Expected ISO 8601 format (YYYY-MM-DDTHH:MM:SSZ).")
 
+class ValueStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+
+class RoadSummary(BaseModel):
+    count: int
+    start: datetime
+    end: datetime
+    polyline: List[GpsData]
+    z: ValueStats
+    air: ValueStats
+    noise: ValueStats
+
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    # Set on a record standing for a window of normal samples
+    summary: Optional[RoadSummary] = None